@@ -0,0 +1,174 @@
+import argparse
+import copy
+import itertools
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from pycpu.mips.tests.config import Config
+from pycpu.mips.tests.test_bench import TestBench
+
+# the program mixes of the benchmark: (mem_op_ratio, loop_probability); of the executed instructions
+# 'straight' has about 23% lw/sw and no loops, 'loops' 16% lw/sw and 11% beq, 'memory' 43% lw/sw
+# (every memory op is preceded by its address setup)
+WORKLOADS = {
+    'straight': (0.4, 0.0),
+    'loops': (0.4, 0.6),
+    'memory': (1.0, 0.0),
+}
+# (max_instructions, memory_cells)
+SIZES = [(64, 10), (200, 256)]
+WORKERS = [1, 4]
+
+
+def percentile(values, p):
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    return values[min(int(p / 100 * len(values)), len(values) - 1)]
+
+
+# a copy of the cpu folder with the data memory resized to memory_cells (the bundled design has 10 cells)
+def prepare_cpu(cpu_folder, folder, memory_cells):
+    shutil.copytree(cpu_folder, folder)
+    path = os.path.join(folder, 'memory.v')
+    with open(path) as f:
+        source = f.read()
+    module = source.index('module data_memory')
+    resized = re.sub(r'(reg\s*\[31:0\]\s*\w+\s*\[0:)\d+(\])', rf'\g<1>{memory_cells - 1}\g<2>', source[module:], count=1)
+    with open(path, 'w') as f:
+        f.write(source[:module] + resized)
+
+
+# runs a single case in this process and writes its measurements to output,
+# build_folder - the simulator builds shared by the cases (a build is cached by the hash of its sources)
+def run_case(config_path, case, output, build_folder):
+    config = Config.from_file(config_path)
+    folder = tempfile.mkdtemp(prefix='benchmark_')
+    try:
+        cpu_folder = os.path.join(folder, 'cpu')
+        prepare_cpu(config.cpu_folder, cpu_folder, case['memory_cells'])
+        config.cpu_folder = cpu_folder
+        config.cpu_test_path = os.path.join(cpu_folder, os.path.basename(config.cpu_test_path))
+        config.multi_cpu_test_path = os.path.join(cpu_folder, os.path.basename(config.multi_cpu_test_path))
+        config.test_build_folder = build_folder
+        config.instructions_folder = os.path.join(folder, 'instructions')
+        config.fails_folder = os.path.join(folder, 'fails')
+        config.result_store = os.path.join(folder, 'results.db')
+        config.minimize_failures = 0
+        config.stop_on_saturation = None
+        config.tests = case['tests']
+        config.seed = case['seed']
+        config.workers = case['workers']
+        config.max_instructions = case['max_instructions']
+        config.memory_cells = case['memory_cells']
+        config.mem_op_ratio, config.loop_probability = WORKLOADS[case['workload']]
+
+        # the test bench output is not a part of the measurement, neither is the compilation of the simulator:
+        # a single test builds it (or finds it in the build folder) before the timed run
+        warmup = copy.copy(config)
+        warmup.tests = 1
+        warmup.workers = 1
+        warmup.result_store = None
+        with open(os.devnull, 'w') as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                TestBench(warmup).run()
+                started = time.perf_counter()
+                TestBench(config).run()
+                seconds = time.perf_counter() - started
+            finally:
+                sys.stdout = stdout
+
+        connection = sqlite3.connect(config.result_store)
+        latencies = list(map(lambda x: x[0], connection.execute('SELECT seconds FROM results')))
+        failed = connection.execute('SELECT COUNT(*) FROM results WHERE status = \'failed\'').fetchone()[0]
+        connection.close()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    # ru_maxrss is in kilobytes on linux (bytes on macos), the children are the simulator processes
+    scale = 1 if sys.platform == 'darwin' else 1024
+    result = dict(case)
+    result.update({
+        'seconds': seconds,
+        'tests_per_second': case['tests'] / seconds,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p99': percentile(latencies, 99),
+        'failed': failed,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20,
+        'peak_rss_children_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 2 ** 20,
+    })
+    with open(output, 'w') as f:
+        json.dump(result, f)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# every case runs in its own process, so the peak rss of a case is its own
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config', nargs='?', default='config.json',
+                        help='the base config (the cpu folder, the simulator and emulator settings)')
+    parser.add_argument('--tests', type=int, default=200, help='tests per case')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workloads', nargs='+', choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument('--sizes', nargs='+', default=list(map(lambda x: f'{x[0]}x{x[1]}', SIZES)),
+                        help='<max_instructions>x<memory_cells>')
+    parser.add_argument('--workers', nargs='+', type=int, default=WORKERS)
+    parser.add_argument('--output', default='benchmark.json', help='the json file with the results')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    parser.add_argument('--case-output', help=argparse.SUPPRESS)
+    parser.add_argument('--build-folder', help=argparse.SUPPRESS)
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.case is not None:
+        run_case(args.config, json.loads(args.case), args.case_output, args.build_folder)
+        sys.exit(0)
+
+    sizes = list(map(lambda x: tuple(map(int, x.split('x'))), args.sizes))
+    results = []
+    build_folder = tempfile.mkdtemp(prefix='benchmark_build_')
+    for workload, (max_instructions, memory_cells), workers in itertools.product(args.workloads, sizes, args.workers):
+        case = {
+            'workload': workload,
+            'max_instructions': max_instructions,
+            'memory_cells': memory_cells,
+            'workers': workers,
+            'tests': args.tests,
+            'seed': args.seed,
+        }
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            subprocess.run([sys.executable, __file__, args.config, '--case', json.dumps(case),
+                            '--case-output', output.name, '--build-folder', build_folder], check=True)
+            with open(output.name) as f:
+                result = json.load(f)
+        results.append(result)
+        print(f'[BENCHMARK] {workload} instructions={max_instructions} cells={memory_cells} workers={workers}: '
+              f'{result["tests_per_second"]:.1f} tests/s p50={result["latency_p50"] * 1000:.1f}ms '
+              f'p99={result["latency_p99"] * 1000:.1f}ms rss={result["peak_rss_mb"]:.0f}MB '
+              f'(simulator {result["peak_rss_children_mb"]:.0f}MB) failed={result["failed"]}')
+
+    shutil.rmtree(build_folder, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'cases': results,
+        }, f, indent=4)
@@ -2,33 +2,191 @@
 `include "memory.v"
 `include "register_file.v"
 
+// the number of data memory cells whose writes are tracked for +sparse_dump
+`ifndef TRACKED_CELLS
+  `define TRACKED_CELLS 65536
+`endif
+
 module cpu_test();
 
   reg clk;
   wire [31:0] instruction_memory_a, instruction_memory_rd;
+  // the program is passed at run time (vvp <build> +program=<path>), so one build serves every program,
+  // programs are read with $readmemb ($readmemh with +hex)
+  reg [8*1024-1:0] _program_file;
+  reg _hex;
+  // +hex_dump - every array is dumped in one line: 'MEMORY_HEX <cell 0> <cell 1> ...' (8 hex digits per cell)
+  reg _hex_dump;
+  // +sparse_dump - only the written data memory cells that are not zero are dumped: 'MEMORY_SPARSE <cell> <hex> ...',
+  // the registers are dumped as with +hex_dump. A write beyond the tracked cells falls back to scanning the whole memory
+  reg _sparse_dump;
+  reg _dirty[0:`TRACKED_CELLS-1];
+  integer _written[0:`TRACKED_CELLS-1];
+  integer _written_count;
+  reg _untracked;
+  integer _cell;
+  // server mode (vvp <build> +server +max_instructions=<n>): lines '<program path> <max cycles>' are read from stdin
+  // one by one, every program is loaded at address 0. The cpu has no reset input, so at the end of a program
+  // a 'beq $0, $0' back to address 0 is put at the current pc and the cpu executes it for one cycle
+  // (the first max_instructions cells, the whole instruction memory without the plusarg, are cleared before loading)
+  reg _server;
+  integer _max_instructions;
+  // the cycle of the beq back to address 0
+  reg _rewind;
+  // a program that runs more than _max_cycles cycles (+max_cycles=<n>, 0 - no limit) ends with TIMEOUT
+  integer _max_cycles;
+  integer _cycles;
+  integer _base;
+  integer _iter;
+
+  task _next_program;
+    begin
+      $display("READY");
+      $fflush();
+      if ($fscanf(32'h8000_0000, "%s %d", _program_file, _max_cycles) != 2)
+        $finish();
+      for (_iter = 0; _iter < $size(cpu_instruction_memory.`INSTR_ARR)
+                      && (_max_instructions == 0 || _iter < _max_instructions); _iter = _iter + 1) begin
+        cpu_instruction_memory.`INSTR_ARR[_iter] = 32'b0;
+      end
+      if (_hex)
+        $readmemh(_program_file, cpu_instruction_memory.`INSTR_ARR);
+      else
+        $readmemb(_program_file, cpu_instruction_memory.`INSTR_ARR);
+      if (_sparse_dump && !_untracked) begin
+        for (_iter = 0; _iter < _written_count; _iter = _iter + 1) begin
+          cpu_data_memory.`MEM_ARR[_written[_iter]] = 32'b0;
+          _dirty[_written[_iter]] = 1'b0;
+        end
+      end else begin
+        for (_iter = 0; _iter < $size(cpu_data_memory.`MEM_ARR); _iter = _iter + 1) begin
+          cpu_data_memory.`MEM_ARR[_iter] = 32'b0;
+        end
+        // the cells tracked before the untracked write stay marked otherwise (and are never listed again)
+        for (_iter = 0; _iter < _written_count; _iter = _iter + 1) begin
+          _dirty[_written[_iter]] = 1'b0;
+        end
+      end
+      _written_count = 0;
+      _untracked = 0;
+      for (_iter = 0; _iter < $size(cpu_register.`REG_ARR); _iter = _iter + 1) begin
+        cpu_register.`REG_ARR[_iter] = 32'b0;
+      end
+      _cycles = 0;
+    end
+  endtask
+
+  task _end_program;
+    begin
+      $display("FINISH");
+      if (_server) begin
+        _base = instruction_memory_a >> 2;
+        if (^instruction_memory_a === 1'bx || _base >= $size(cpu_instruction_memory.`INSTR_ARR)) begin
+          // the cpu is lost, the tester starts a new simulator
+          $display("RESTART");
+          $fflush();
+          $finish();
+        end
+        // beq $0, $0, -(_base + 1): pc + 4 - 4 * (_base + 1) = 0
+        cpu_instruction_memory.`INSTR_ARR[_base] = {6'b000100, 10'b0, 16'hFFFF - _base[15:0]};
+        _rewind = 1;
+      end else begin
+        $finish();
+      end
+    end
+  endtask
+
   initial begin
       clk = 0;
-      $readmemb(`SOURCE_FILE, cpu_instruction_memory.`INSTR_ARR);
+      _cycles = 0;
+      _server = $test$plusargs("server");
+      _hex = $test$plusargs("hex");
+      _hex_dump = $test$plusargs("hex_dump");
+      _sparse_dump = $test$plusargs("sparse_dump");
+      _written_count = 0;
+      _untracked = 0;
+      _rewind = 0;
+      if (!$value$plusargs("max_instructions=%d", _max_instructions))
+        _max_instructions = 0;
+      if (!$value$plusargs("max_cycles=%d", _max_cycles))
+        _max_cycles = 0;
+      if (_server) begin
+        _next_program();
+      end else begin
+        if (!$value$plusargs("program=%s", _program_file)) begin
+            $display("ERROR: no program file (+program=<path>)");
+            $finish();
+        end
+        if (_hex)
+          $readmemh(_program_file, cpu_instruction_memory.`INSTR_ARR);
+        else
+          $readmemb(_program_file, cpu_instruction_memory.`INSTR_ARR);
+      end
       forever
         #1 clk = ~clk;
   end
 
-  integer _iter;
   always @(negedge clk) begin
-        if (instruction_memory_rd == 32'b0) begin
-            $display("MEMORY_DUMP_BEGIN");
-            for (_iter = 0; _iter < $size(cpu_data_memory.`MEM_ARR); _iter = _iter + 1) begin
-              $display("%d %b", _iter, cpu_data_memory.`MEM_ARR[_iter]);
+        if (_rewind) begin
+            _rewind = 0;
+            if (instruction_memory_a !== 32'b0) begin
+                // the cpu did not take the beq, the tester starts a new simulator
+                $display("RESTART");
+                $fflush();
+                $finish();
             end
-            $display("MEMORY_DUMP_END");
-            $display("REG_DUMP_BEGIN");
-            for (_iter = 0; _iter < $size(cpu_register.`REG_ARR); _iter = _iter + 1) begin
-              $display("%d %b", _iter, cpu_register.`REG_ARR[_iter]);
+            _next_program();
+        end else if (instruction_memory_rd == 32'b0) begin
+            if (_sparse_dump) begin
+              $write("MEMORY_SPARSE");
+              if (_untracked) begin
+                for (_iter = 0; _iter < $size(cpu_data_memory.`MEM_ARR); _iter = _iter + 1) begin
+                  if (cpu_data_memory.`MEM_ARR[_iter] !== 32'b0)
+                    $write(" %0d %h", _iter, cpu_data_memory.`MEM_ARR[_iter]);
+                end
+              end else begin
+                for (_iter = 0; _iter < _written_count; _iter = _iter + 1) begin
+                  if (cpu_data_memory.`MEM_ARR[_written[_iter]] !== 32'b0)
+                    $write(" %0d %h", _written[_iter], cpu_data_memory.`MEM_ARR[_written[_iter]]);
+                end
+              end
+              $display("");
+              $write("REG_HEX");
+              for (_iter = 0; _iter < $size(cpu_register.`REG_ARR); _iter = _iter + 1) begin
+                $write(" %h", cpu_register.`REG_ARR[_iter]);
+              end
+              $display("");
+            end else if (_hex_dump) begin
+              $write("MEMORY_HEX");
+              for (_iter = 0; _iter < $size(cpu_data_memory.`MEM_ARR); _iter = _iter + 1) begin
+                $write(" %h", cpu_data_memory.`MEM_ARR[_iter]);
+              end
+              $display("");
+              $write("REG_HEX");
+              for (_iter = 0; _iter < $size(cpu_register.`REG_ARR); _iter = _iter + 1) begin
+                $write(" %h", cpu_register.`REG_ARR[_iter]);
+              end
+              $display("");
+            end else begin
+              $display("MEMORY_DUMP_BEGIN");
+              for (_iter = 0; _iter < $size(cpu_data_memory.`MEM_ARR); _iter = _iter + 1) begin
+                $display("%d %b", _iter, cpu_data_memory.`MEM_ARR[_iter]);
+              end
+              $display("MEMORY_DUMP_END");
+              $display("REG_DUMP_BEGIN");
+              for (_iter = 0; _iter < $size(cpu_register.`REG_ARR); _iter = _iter + 1) begin
+                $display("%d %b", _iter, cpu_register.`REG_ARR[_iter]);
+              end
+              $display("REG_DUMP_END");
             end
-            $display("REG_DUMP_END");
-            $display("FINISH");
-            $finish();
-        end;
+            _end_program();
+        end else begin
+            _cycles = _cycles + 1;
+            if (_max_cycles > 0 && _cycles > _max_cycles) begin
+                $display("TIMEOUT");
+                _end_program();
+            end
+        end
    end
 
 
@@ -71,4 +229,18 @@ module cpu_test();
                .register_wd3(register_wd3),
                .register_rd1(register_rd1),
                .register_rd2(register_rd2));
+
+  // the cells are tracked as the data memory addresses them (a >> 2)
+  always @(posedge clk) begin
+        if (_sparse_dump && data_memory_we === 1'b1) begin
+            _cell = data_memory_a >> 2;
+            if (^data_memory_a === 1'bx || _cell >= `TRACKED_CELLS)
+                _untracked = 1;
+            else if (_dirty[_cell] !== 1'b1) begin
+                _dirty[_cell] = 1'b1;
+                _written[_written_count] = _cell;
+                _written_count = _written_count + 1;
+            end
+        end
+  end
 endmodule
@@ -0,0 +1,204 @@
+`include "mips_cpu.v"
+`include "memory.v"
+`include "register_file.v"
+
+// simulates `INSTANCES independent cpus in one vvp run (vvp <build> +programs=<manifest>),
+// the manifest contains a '<program path> <max cycles>' line per slot (0 - no limit),
+// unused slots are finished right away, programs are read with $readmemb ($readmemh with +hex),
+// +hex_dump - the arrays are dumped as 'MEMORY_HEX ...'/'REG_HEX ...' lines,
+// +sparse_dump - only the written non-zero memory cells are dumped (see cpu_test.v)
+`ifndef INSTANCES
+  `define INSTANCES 8
+`endif
+`ifndef TRACKED_CELLS
+  `define TRACKED_CELLS 65536
+`endif
+
+module cpu_test_multi();
+
+  reg clk;
+  reg [8*1024-1:0] _manifest_file;
+  reg [8*1024-1:0] _line;
+  reg [8*1024-1:0] _program_files[0:`INSTANCES-1];
+  integer _slot_max_cycles[0:`INSTANCES-1];
+  integer _slot_cycles;
+  reg [`INSTANCES-1:0] _done;
+  reg _ready;
+  reg _hex;
+  reg _hex_dump;
+  reg _sparse_dump;
+  integer _programs;
+  integer _fd;
+  integer _i;
+
+  initial begin
+      clk = 0;
+      _ready = 0;
+      _done = 0;
+      _programs = 0;
+      _hex = $test$plusargs("hex");
+      _hex_dump = $test$plusargs("hex_dump");
+      _sparse_dump = $test$plusargs("sparse_dump");
+      if (!$value$plusargs("programs=%s", _manifest_file)) begin
+          $display("ERROR: no manifest file (+programs=<path>)");
+          $finish();
+      end
+      _fd = $fopen(_manifest_file, "r");
+      while (_programs < `INSTANCES && $fscanf(_fd, "%s %d", _line, _slot_cycles) == 2) begin
+          _program_files[_programs] = _line;
+          _slot_max_cycles[_programs] = _slot_cycles;
+          _programs = _programs + 1;
+      end
+      $fclose(_fd);
+      for (_i = _programs; _i < `INSTANCES; _i = _i + 1) begin
+          _done[_i] = 1'b1;
+      end
+      _ready = 1;
+      forever
+        #1 clk = ~clk;
+  end
+
+  // every slot dumps at its own breakpoint, the run ends once all of them are done
+  always @(posedge clk) begin
+        if (&_done) begin
+            $display("FINISH");
+            $finish();
+        end
+  end
+
+  genvar k;
+  generate
+    for (k = 0; k < `INSTANCES; k = k + 1) begin : slot
+      wire [31:0] instruction_memory_a, instruction_memory_rd;
+
+      initial begin
+          wait (_ready);
+          if (k < _programs && _hex)
+            $readmemh(_program_files[k], cpu_instruction_memory.`INSTR_ARR);
+          else if (k < _programs)
+            $readmemb(_program_files[k], cpu_instruction_memory.`INSTR_ARR);
+      end
+
+      integer _iter;
+      integer _cycles = 0;
+      reg _dirty[0:`TRACKED_CELLS-1];
+      integer _written[0:`TRACKED_CELLS-1];
+      integer _written_count = 0;
+      reg _untracked = 0;
+      integer _cell;
+
+      always @(negedge clk) begin
+            if (!_done[k] && instruction_memory_rd !== 32'b0) begin
+                _cycles = _cycles + 1;
+                if (_slot_max_cycles[k] > 0 && _cycles > _slot_max_cycles[k]) begin
+                    $display("INSTANCE %0d", k);
+                    $display("TIMEOUT");
+                    $display("INSTANCE_END");
+                    _done[k] = 1'b1;
+                end
+            end
+            if (!_done[k] && instruction_memory_rd == 32'b0) begin
+                $display("INSTANCE %0d", k);
+                if (_sparse_dump) begin
+                  $write("MEMORY_SPARSE");
+                  if (_untracked) begin
+                    for (_iter = 0; _iter < $size(cpu_data_memory.`MEM_ARR); _iter = _iter + 1) begin
+                      if (cpu_data_memory.`MEM_ARR[_iter] !== 32'b0)
+                        $write(" %0d %h", _iter, cpu_data_memory.`MEM_ARR[_iter]);
+                    end
+                  end else begin
+                    for (_iter = 0; _iter < _written_count; _iter = _iter + 1) begin
+                      if (cpu_data_memory.`MEM_ARR[_written[_iter]] !== 32'b0)
+                        $write(" %0d %h", _written[_iter], cpu_data_memory.`MEM_ARR[_written[_iter]]);
+                    end
+                  end
+                  $display("");
+                  $write("REG_HEX");
+                  for (_iter = 0; _iter < $size(cpu_register.`REG_ARR); _iter = _iter + 1) begin
+                    $write(" %h", cpu_register.`REG_ARR[_iter]);
+                  end
+                  $display("");
+                end else if (_hex_dump) begin
+                  $write("MEMORY_HEX");
+                  for (_iter = 0; _iter < $size(cpu_data_memory.`MEM_ARR); _iter = _iter + 1) begin
+                    $write(" %h", cpu_data_memory.`MEM_ARR[_iter]);
+                  end
+                  $display("");
+                  $write("REG_HEX");
+                  for (_iter = 0; _iter < $size(cpu_register.`REG_ARR); _iter = _iter + 1) begin
+                    $write(" %h", cpu_register.`REG_ARR[_iter]);
+                  end
+                  $display("");
+                end else begin
+                  $display("MEMORY_DUMP_BEGIN");
+                  for (_iter = 0; _iter < $size(cpu_data_memory.`MEM_ARR); _iter = _iter + 1) begin
+                    $display("%d %b", _iter, cpu_data_memory.`MEM_ARR[_iter]);
+                  end
+                  $display("MEMORY_DUMP_END");
+                  $display("REG_DUMP_BEGIN");
+                  for (_iter = 0; _iter < $size(cpu_register.`REG_ARR); _iter = _iter + 1) begin
+                    $display("%d %b", _iter, cpu_register.`REG_ARR[_iter]);
+                  end
+                  $display("REG_DUMP_END");
+                end
+                $display("INSTANCE_END");
+                _done[k] = 1'b1;
+            end
+      end
+
+      instruction_memory cpu_instruction_memory(.a(instruction_memory_a), .rd(instruction_memory_rd));
+
+      wire data_memory_we;
+      wire [31:0] data_memory_a, data_memory_rd, data_memory_wd;
+
+      data_memory cpu_data_memory(.a(data_memory_a),
+          .we(data_memory_we),
+          .clk(clk),
+          .wd(data_memory_wd),
+          .rd(data_memory_rd)
+        );
+
+      wire register_we3;
+      wire [4:0] register_a1, register_a2, register_a3;
+      wire [31:0] register_rd1, register_rd2, register_wd3;
+
+      register_file cpu_register(.clk(clk),
+                                 .we3(register_we3),
+                                 .a1(register_a1),
+                                 .a2(register_a2),
+                                 .a3(register_a3),
+                                 .wd3(register_wd3),
+                                 .rd1(register_rd1),
+                                 .rd2(register_rd2));
+
+      mips_cpu cpu(.clk(clk),
+                   .instruction_memory_a(instruction_memory_a),
+                   .instruction_memory_rd(instruction_memory_rd),
+                   .data_memory_a(data_memory_a),
+                   .data_memory_rd(data_memory_rd),
+                   .data_memory_we(data_memory_we),
+                   .data_memory_wd(data_memory_wd),
+                   .register_a1(register_a1),
+                   .register_a2(register_a2),
+                   .register_a3(register_a3),
+                   .register_we3(register_we3),
+                   .register_wd3(register_wd3),
+                   .register_rd1(register_rd1),
+                   .register_rd2(register_rd2));
+
+      // the cells are tracked as the data memory addresses them (a >> 2)
+      always @(posedge clk) begin
+            if (_sparse_dump && !_done[k] && data_memory_we === 1'b1) begin
+                _cell = data_memory_a >> 2;
+                if (^data_memory_a === 1'bx || _cell >= `TRACKED_CELLS)
+                    _untracked = 1;
+                else if (_dirty[_cell] !== 1'b1) begin
+                    _dirty[_cell] = 1'b1;
+                    _written[_written_count] = _cell;
+                    _written_count = _written_count + 1;
+                end
+            end
+      end
+    end
+  endgenerate
+endmodule
@@ -0,0 +1,19 @@
+import argparse
+import sys
+
+from pycpu.mips.tests.summary import format_summary, load_summary, merge_summaries, write_summary
+
+# combines the summaries of the shards of a run (tester.py --shard i/n --summary <path>)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('summaries', nargs='+')
+    parser.add_argument('--output', help='write the merged summary to this json file')
+    args = parser.parse_args(sys.argv[1:])
+
+    try:
+        summary = merge_summaries(list(map(load_summary, args.summaries)))
+    except ValueError as ex:
+        sys.exit(f'[ERROR] {ex}')
+    print(format_summary(summary))
+    if args.output is not None:
+        write_summary(args.output, summary)
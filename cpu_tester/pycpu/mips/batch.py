@@ -0,0 +1,170 @@
+import numpy as np
+
+from pycpu.mips import fast, semantics
+from pycpu.mips.mips import MIPS
+from pycpu.mips.program import Program, decode_fields
+
+# the value computations of the register writers by opcode (the register writers are the first opcodes),
+# wrapped to 32 bits once the value of every lane is picked
+_CANDIDATES = list(map(lambda x: semantics.EVALUATE_UNWRAPPED[x], range(len(semantics.EVALUATE_UNWRAPPED))))
+_WRITES_REGISTER = np.array(list(map(lambda x: x in semantics.WRITES, range(len(fast.OPCODES)))))
+_WRITES_RD = np.array(list(map(lambda x: semantics.WRITES.get(x) == 'arg', range(len(fast.OPCODES)))))
+
+# the messages of the failed lanes, the errors the 'fast' engine raises for the same programs
+TIMEOUT = 'mips processor timeout...'
+LOAD_OUT_OF_RANGE = 'list index out of range'
+STORE_OUT_OF_RANGE = 'list assignment index out of range'
+
+
+class BatchMIPS(object):
+    # a lock-step costs about as much as running this many lanes one instruction further with fast.run,
+    # so the last lanes of a batch (the programs that run the longest) are finished one by one
+    SCALAR_LANES = 64
+
+    # runs many programs in lock-step, one lane per program (a lane that has finished or failed is masked out):
+    # the registers and the memories of all the lanes are (lanes, reg_cnt) and (lanes, mem_size) int32 arrays
+    # (they are kept in int64 while running, the values are wrapped to 32 bits as in the other engines)
+    def __init__(self,
+                 mem_size=2048,
+                 reg_cnt=32):
+        self._mem_size = mem_size
+        self._reg_cnt = reg_cnt
+        self.registers = np.zeros((0, reg_cnt), dtype=np.int32)
+        self.memory = np.zeros((0, mem_size), dtype=np.int32)
+        self.steps = np.zeros(0, dtype=np.int64)
+        self.timed_out = np.zeros(0, dtype=bool)
+        self.failed = np.zeros(0, dtype=bool)
+        # {lane: message} of the timed out and the failed lanes
+        self.errors = {}
+
+    # the fields of all the programs decoded at once from their machine words into (lanes, width) arrays,
+    # padded with beq (one extra column, so the program counter of a finished lane always points inside the arrays)
+    @staticmethod
+    def _pack(programs):
+        programs = list(map(Program.from_instructions, programs))
+        lengths = np.array(list(map(len, programs)), dtype=np.int64)
+        width = int(lengths.max(initial=0)) + 1
+        words = np.concatenate([np.zeros(0, dtype=np.uint32)] + list(map(lambda x: np.asarray(x.words), programs)))
+        row = np.repeat(np.arange(len(programs)), lengths)
+        column = np.arange(len(words)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        packed = []
+        for field, fill in zip(decode_fields(words), (fast.OP_BEQ, 0, 0, 0)):
+            array = np.full((len(programs), width), fill, dtype=np.int64)
+            array[row, column] = field
+            packed.append(array)
+        return lengths, packed[0], packed[1], packed[2], packed[3]
+
+    # programs - Programs or lists of instructions
+    # max_steps - the maximum number of instructions executed by a lane, the lanes above it are marked as timed out
+    def run(self, programs, max_steps=None):
+        lanes = len(programs)
+        lengths, ops, rs, rt, args = BatchMIPS._pack(programs)
+        width = ops.shape[1]
+        regs = np.zeros(lanes * self._reg_cnt, dtype=np.int64)
+        memory = np.zeros(lanes * self._mem_size, dtype=np.int64)
+        steps = np.zeros(lanes, dtype=np.int64)
+        timed_out = np.zeros(lanes, dtype=bool)
+        failed = np.zeros(lanes, dtype=bool)
+        errors = {}
+
+        # the programs with an unsupported instruction are not run
+        invalid = np.flatnonzero((ops < 0).any(axis=1))
+        for i in invalid.tolist():
+            at = int(np.argmax(ops[i] < 0))
+            errors[i] = f'unsupported instruction: {int(Program.from_instructions(programs[i])[at]):032b} (pc={at})'
+            failed[i] = True
+
+        # the running lanes and their state, all the lanes have executed step instructions
+        lane = np.flatnonzero((lengths > 0) & ~failed)
+        lane_pc = np.zeros(len(lane), dtype=np.int64)
+        lane_length = lengths[lane]
+        row = lane * width
+        reg_base = lane * self._reg_cnt
+        mem_base = lane * self._mem_size
+        step = 0
+        # the fields of an instruction are fetched at once: code[lane * width + pc] - (op, rs, rt, arg)
+        code = np.stack((ops, rs, rt, args), axis=-1).reshape(-1, 4)
+
+        while len(lane) >= BatchMIPS.SCALAR_LANES:
+            if step == max_steps:
+                timed_out[lane] = True
+                errors.update(map(lambda x: (x, TIMEOUT), lane.tolist()))
+                steps[lane] = step
+                lane = lane[:0]
+                break
+
+            op, a, b, c = code[row + lane_pc].T
+            rb = reg_base + b
+            va, vb = regs[reg_base + a], regs[rb]
+
+            # memory accesses outside of the memory stop the lane (negative indices wrap, as in a python list)
+            is_sw = op == fast.OP_SW
+            addr = semantics.EVALUATE_ADDRESS(va, c)
+            bad = ((op == fast.OP_LW) | is_sw) & ((addr < -self._mem_size) | (addr >= self._mem_size))
+            if bad.any():
+                failed[lane[bad]] = True
+                steps[lane[bad]] = step
+                messages = np.where(is_sw[bad], STORE_OUT_OF_RANGE, LOAD_OUT_OF_RANGE).tolist()
+                errors.update(zip(lane[bad].tolist(), messages))
+                keep = ~bad
+                lane, lane_pc, lane_length, row, reg_base, mem_base = \
+                    lane[keep], lane_pc[keep], lane_length[keep], row[keep], reg_base[keep], mem_base[keep]
+                op, c, rb, va, vb, addr, is_sw = \
+                    op[keep], c[keep], rb[keep], va[keep], vb[keep], addr[keep], is_sw[keep]
+            mem_at = mem_base + addr % self._mem_size
+            load = memory[mem_at]
+
+            # every candidate value is computed for every lane and the opcode picks one
+            # (the instructions that write no register pick any, it is not written)
+            value = semantics.EVALUATE_WRAP(np.choose(np.minimum(op, len(_CANDIDATES) - 1),
+                                                      list(map(lambda x: x(va, vb, c, load), _CANDIDATES))))
+            writes = _WRITES_REGISTER[op]
+            target = np.where(_WRITES_RD[op], reg_base + c, rb)
+            regs[target[writes]] = value[writes]
+            memory[mem_at[is_sw]] = semantics.EVALUATE_STORED(va, vb)[is_sw]
+
+            taken = (op == fast.OP_BEQ) & semantics.EVALUATE_TAKEN(va, vb)
+            lane_pc = lane_pc + 1 + taken * c
+            step += 1
+            running = (lane_pc >= 0) & (lane_pc < lane_length)
+            if not running.all():
+                steps[lane[~running]] = step
+                lane, lane_pc, lane_length, row, reg_base, mem_base = \
+                    lane[running], lane_pc[running], lane_length[running], row[running], reg_base[running], \
+                    mem_base[running]
+
+        # the last lanes are finished one by one
+        for i, pc in zip(lane.tolist(), lane_pc.tolist()):
+            n = int(lengths[i])
+            program = fast.Predecoded(*map(lambda x: x[i, :n].tolist(), (ops, rs, rt, args)))
+            registers = regs[i * self._reg_cnt:(i + 1) * self._reg_cnt]
+            cells = memory[i * self._mem_size:(i + 1) * self._mem_size]
+            scalar_registers, scalar_cells = registers.tolist(), cells.tolist()
+            steps[i] = step
+            try:
+                steps[i] += fast.run(program, scalar_registers, scalar_cells,
+                                     max_steps=None if max_steps is None else max_steps - step, pc=pc)
+            except TimeoutError as ex:
+                timed_out[i] = True
+                errors[i] = str(ex)
+            except IndexError as ex:
+                failed[i] = True
+                errors[i] = str(ex)
+            registers[:] = scalar_registers
+            cells[:] = scalar_cells
+
+        self.registers = regs.reshape(lanes, self._reg_cnt).astype(np.int32)
+        self.memory = memory.reshape(lanes, self._mem_size).astype(np.int32)
+        self.steps = steps
+        self.timed_out = timed_out
+        self.failed = failed
+        self.errors = errors
+
+    # the state of a single lane as a MIPS processor
+    def lane(self, i):
+        cpu = MIPS(mem_size=self._mem_size, reg_cnt=self._reg_cnt)
+        cpu.registers = self.registers[i].tolist()
+        cpu.memory = self.memory[i].tolist()
+        cpu.written = set(np.flatnonzero(self.memory[i]).tolist())
+        cpu.steps = int(self.steps[i])
+        return cpu
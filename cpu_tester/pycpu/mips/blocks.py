@@ -0,0 +1,130 @@
+import threading
+
+from pycpu.mips import fast, semantics
+
+# compiled loops shared by all the programs, keyed by the content of the loop (the oldest are evicted)
+_cache = {}
+_cache_lock = threading.Lock()
+CACHE_LIMIT = 1024
+# compiling a loop costs about as much as interpreting a hundred iterations of it (both grow with the length
+# of the body), so a loop is compiled once it has iterated that many times in a program, or at once when it is
+# in the cache already. The loops of ProgramGenerator iterate at most 40 times, they are always interpreted
+HOT_LOOP_ITERATIONS = 64
+
+
+# a loop - a block that ends with a beq to its own start - compiled into a function(registers, memory,
+# written, budget) that keeps the registers in locals and runs it until the beq falls through or for budget
+# iterations (-1 - no budget), returns the number of iterations
+def _loop_source(block):
+    used = set()
+    written = set()
+    for op, rs, rt, arg in block:
+        used.update((rs, rt))
+        if op in semantics.WRITES:
+            target = arg if semantics.WRITES[op] == 'arg' else rt
+            used.add(target)
+            written.add(target)
+
+    _, x, y, _ = block[-1]
+    lines = ['def _loop(r, m, w, budget):']
+    lines.extend(f'    r{i} = r[{i}]' for i in sorted(used))
+    lines.append('    i = 0')
+    lines.append('    while True:')
+    for op, rs, rt, arg in block[:-1]:
+        statements = semantics.statements(op, rs, rt, arg, 'r{}'.format, 'm', 'w', [])
+        lines.extend(map(lambda s: '        ' + s, statements))
+    lines.append('        i += 1')
+    lines.append(f'        if not ({semantics.TAKEN.format(a=f"r{x}", b=f"r{y}")}) or i == budget:')
+    lines.append('            break')
+    lines.extend(f'    r[{i}] = r{i}' for i in sorted(written))
+    lines.append('    return i')
+    return '\n'.join(lines)
+
+
+def compile_loop(block):
+    with _cache_lock:
+        fn = _cache.get(block)
+    if fn is None:
+        fn = semantics.define(_loop_source(block), '_loop')
+        with _cache_lock:
+            while len(_cache) >= CACHE_LIMIT:
+                del _cache[next(iter(_cache))]
+            _cache[block] = fn
+    return fn
+
+
+class Translated(object):
+    def __init__(self, blocks, length):
+        # blocks[pc] - (instructions without the final beq, length, end, beq rs, beq rt, beq target, loop)
+        # for every block start, None elsewhere (the target of a block without a beq is its end);
+        # loop - [compiled function or None, iterations in this program, the block] of a loop, None otherwise
+        self.blocks = blocks
+        self.length = length
+
+
+# splits a program into basic blocks (at BEQ targets and after every BEQ)
+def translate(instructions):
+    program = fast.predecode(instructions)
+    ops, rs, rt, args = program.ops, program.rs, program.rt, program.args
+    n = len(program)
+    leaders = {0}
+    for pc in range(n):
+        if ops[pc] == fast.OP_BEQ:
+            leaders.add(pc + 1)
+            leaders.add(pc + args[pc] + 1)
+    starts = sorted(filter(lambda x: 0 <= x < n, leaders))
+
+    code = list(zip(ops, rs, rt, args))
+    blocks = [None] * n
+    for start, end in zip(starts, starts[1:] + [n]):
+        last = end - 1
+        if ops[last] != fast.OP_BEQ:
+            blocks[start] = (tuple(code[start:end]), end - start, end, 0, 0, end, None)
+            continue
+        target = end + args[last]
+        loop = None
+        if target == start:
+            block = tuple(code[start:end])
+            with _cache_lock:
+                fn = _cache.get(block)
+            loop = [fn, 0, block]
+        blocks[start] = (tuple(code[start:last]), end - start, end, rs[last], rt[last], target, loop)
+    return Translated(blocks, n)
+
+
+_TAKEN = semantics.TAKEN.format(a='registers[x]', b='registers[y]')
+
+
+# same contract as fast.run (the blocks are interpreted by an if/elif chain generated from the semantics table,
+# the hot loops run compiled)
+run = semantics.define('\n'.join([
+    'def run(program, registers, memory, max_steps=None, written=None):',
+    '    if written is None:',
+    '        written = set()',
+    '    blocks, n = program.blocks, program.length',
+    '    pc = 0',
+    '    steps = 0',
+    '    limit = -1 if max_steps is None else max_steps',
+    '    while 0 <= pc < n:',
+    '        body, length, end, x, y, target, loop = blocks[pc]',
+    '        if loop is not None:',
+    '            if loop[0] is None:',
+    '                loop[1] += 1',
+    '                if loop[1] >= HOT_LOOP_ITERATIONS:',
+    '                    loop[0] = compile_loop(loop[2])',
+    '            if loop[0] is not None:',
+    '                budget = -1 if limit < 0 else (limit - steps) // length',
+    '                if budget == 0:',
+    "                    raise TimeoutError('mips processor timeout...')",
+    '                steps += loop[0](registers, memory, written, budget) * length',
+    f'                pc = target if {_TAKEN} else end',
+    '                continue',
+    '        steps += length',
+    '        if steps > limit >= 0:',
+    "            raise TimeoutError('mips processor timeout...')",
+    '        for op, a, b, c in body:',
+    *semantics.dispatch('op', 'a', 'b', 'c', 'registers[{}]'.format, 'memory', 'written', [], indent=12,
+                        codes=tuple(filter(lambda x: x != fast.OP_BEQ, semantics.DISPATCH_ORDER))),
+    f'        pc = target if {_TAKEN} else end',
+    '    return steps',
+]), 'run', globals())
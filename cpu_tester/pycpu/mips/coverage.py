@@ -0,0 +1,106 @@
+from pycpu.mips import semantics
+from pycpu.mips.program import *
+
+# the instructions that write a register
+_REG_WRITERS = tuple(semantics.WRITES)
+# reads of a register written that many executed instructions before
+HAZARD_DISTANCES = (1, 2, 3)
+
+# functional coverage bins:
+#   ('pair', a, b) - b executed right after a
+#   ('hazard', op, d) - op reads a register written d instructions before
+#   ('branch', taken) - a beq taken/not taken
+#   ('memory', a, b, adjacent) - b accesses the cell last accessed by a (adjacent - by the previous instruction)
+#   ('zero', op) - op writes $0
+BINS = (
+    [('pair', a, b) for a in OPCODES.values() for b in OPCODES.values()] +
+    [('hazard', op, d) for op in OPCODES.values() for d in HAZARD_DISTANCES] +
+    [('branch', taken) for taken in (False, True)] +
+    [('memory', a, b, adjacent) for a in (OP_LW, OP_SW) for b in (OP_LW, OP_SW) for adjacent in (False, True)] +
+    [('zero', op) for op in _REG_WRITERS]
+)
+BIN_INDEX = dict(map(lambda x: (x[1], x[0]), enumerate(BINS)))
+
+_PAIR = [[BIN_INDEX['pair', a, b] for b in range(len(OPCODES))] for a in range(len(OPCODES))]
+_HAZARD = [[BIN_INDEX['hazard', op, d] if d in HAZARD_DISTANCES else None for d in range(4)]
+           for op in range(len(OPCODES))]
+_READS_RT = list(map(semantics.reads_rt, range(len(OPCODES))))
+_MEMORY = dict(map(lambda x: ((x[1], x[2], x[3]), BIN_INDEX[x]), filter(lambda x: x[0] == 'memory', BINS)))
+
+
+def bin_name(b):
+    # the fields of a bin are opcodes except the hazard distance and the flags
+    ops = b[1:2] if b[0] == 'hazard' else b[1:]
+    names = list(map(lambda x: CLASSES[x].__name__.lower() if type(x) is int else str(x).lower(), ops))
+    return f'{b[0]}({", ".join(names + list(map(str, b[1 + len(ops):])))})'
+
+
+# runs a predecoded program (see semantics.execute, on zeroed registers and memory) and returns the bins it hit
+# as a bit mask (bit i - BINS[i])
+def trace(program, reg_cnt, mem_size, max_steps=None):
+    rs, rt = program.rs, program.rt
+    # the step that last wrote every register, the last access of every memory cell: (op, step)
+    written = [-4] * reg_cnt
+    accessed = {}
+    hit = set()
+    previous = None
+    for step, (pc, op, target, cell, taken) in enumerate(semantics.execute(program, reg_cnt, mem_size, max_steps)):
+        if previous is not None:
+            hit.add(_PAIR[previous][op])
+        previous = op
+
+        for register in (rs[pc], rt[pc]) if _READS_RT[op] else (rs[pc],):
+            distance = step - written[register]
+            if register != 0 and distance <= 3:
+                hit.add(_HAZARD[op][distance])
+
+        if cell is not None:
+            last = accessed.get(cell)
+            if last is not None:
+                hit.add(_MEMORY[last[0], op, last[1] == step - 1])
+            accessed[cell] = (op, step)
+        if taken is not None:
+            hit.add(BIN_INDEX['branch', taken])
+        if target is not None:
+            if target == 0:
+                hit.add(BIN_INDEX['zero', op])
+            written[target] = step
+
+    mask = 0
+    for i in hit:
+        mask |= 1 << i
+    return mask
+
+
+# the coverage of a run: the number of programs that hit every bin
+class Coverage(object):
+    def __init__(self):
+        self.hits = [0] * len(BINS)
+        self.programs = 0
+
+    def add(self, mask):
+        self.programs += 1
+        i = 0
+        while mask:
+            if mask & 1:
+                self.hits[i] += 1
+            mask >>= 1
+            i += 1
+
+    def covered(self):
+        return sum(map(lambda x: x > 0, self.hits))
+
+    def missing(self):
+        return list(map(lambda x: BINS[x], filter(lambda x: self.hits[x] == 0, range(len(BINS)))))
+
+    def report(self, limit=20):
+        lines = [f'[COVERAGE] programs={self.programs} covered={self.covered()}/{len(BINS)} '
+                 f'({100 * self.covered() / len(BINS):.1f}%)']
+        for kind in dict.fromkeys(map(lambda x: x[0], BINS)):
+            indices = list(filter(lambda x: BINS[x][0] == kind, range(len(BINS))))
+            lines.append(f'  {kind}: {sum(map(lambda x: self.hits[x] > 0, indices))}/{len(indices)}')
+        missing = self.missing()
+        if len(missing) > 0:
+            names = list(map(bin_name, missing[:limit]))
+            lines.append(f'  missing: {", ".join(names)}{", ..." if len(missing) > limit else ""}')
+        return '\n'.join(lines)
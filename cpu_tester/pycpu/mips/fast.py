@@ -0,0 +1,73 @@
+
+from pycpu.mips import semantics
+from pycpu.mips.program import *
+
+
+class Predecoded(object):
+    def __init__(self, ops, rs, rt, args):
+        # opcode, rs, rt and rd (R-type) or the immediate (I-type) of every instruction as plain ints
+        self.ops = ops
+        self.rs = rs
+        self.rt = rt
+        self.args = args
+
+    def __len__(self):
+        return len(self.ops)
+
+
+# instructions - a list of instructions or a Program
+def predecode(instructions):
+    if isinstance(instructions, Program):
+        return Predecoded(*instructions.fields())
+
+    ops, rs, rt, args = [], [], [], []
+    for inst in instructions:
+        op = OPCODES.get(type(inst))
+        if op is None:
+            raise ValueError(f'unsupported instruction: {inst}')
+        ops.append(op)
+        rs.append(int(inst.rs))
+        rt.append(int(inst.rt))
+        if op <= OP_SLT:
+            args.append(int(inst.rd))
+        elif op == OP_ADDI:
+            args.append(int(inst.imm))
+        else:
+            args.append(int(inst.offset))
+    return Predecoded(ops, rs, rt, args)
+
+
+# executes a predecoded program on plain int registers (wrapped to 32 bits) and memory cells,
+# max_steps bounds the number of executed instructions, returns the number of executed instructions;
+# the indices of the written memory cells are added to the written set, pc - the first executed instruction
+# (the instructions are dispatched by an if/elif chain generated from the semantics table)
+run = semantics.define('\n'.join([
+    'def run(program, registers, memory, max_steps=None, written=None, pc=0):',
+    '    if written is None:',
+    '        written = set()',
+    '    ops, rs, rt, args = program.ops, program.rs, program.rt, program.args',
+    '    n = len(ops)',
+    '    steps = 0',
+    '    limit = -1 if max_steps is None else max_steps',
+    '    while 0 <= pc < n:',
+    '        if steps == limit:',
+    "            raise TimeoutError('mips processor timeout...')",
+    '        steps += 1',
+    '        op = ops[pc]',
+    *semantics.dispatch('op', 'rs[pc]', 'rt[pc]', 'args[pc]', 'registers[{}]'.format, 'memory', 'written',
+                        ['pc += args[pc]'], indent=8),
+    '        pc += 1',
+    '    return steps',
+]), 'run')
+
+
+# runs a predecoded program on zeroed registers and memory (as run) and returns the opcode
+# that last wrote every register and memory cell: ({register: op}, {cell: op}), used to classify failures
+def last_writers(program: Predecoded, reg_cnt, mem_size, max_steps=None):
+    reg_writers, mem_writers = {}, {}
+    for _, op, target, cell, _ in semantics.execute(program, reg_cnt, mem_size, max_steps):
+        if target is not None:
+            reg_writers[target] = op
+        elif op == OP_SW:
+            mem_writers[cell] = op
+    return reg_writers, mem_writers
@@ -1,13 +1,10 @@
 from pycpu.instruction import Instruction
-from pycpu.mips.util import bindigits, twos_comp
+from pycpu.mips.util import bindigits, twos_comp, wrap32
 from pycpu.processor import Processor
-import numpy as np
-
-np.warnings.simplefilter("ignore", RuntimeWarning)
 
 
 def i32(val):
-    return np.int32(val)
+    return wrap32(val)
 
 
 class LW(Instruction):
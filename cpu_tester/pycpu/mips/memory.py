@@ -0,0 +1,49 @@
+PAGE_BITS = 10
+
+
+# memory cells stored in pages that are allocated on the first write (reads of unwritten cells return 0).
+# reset() invalidates all the pages at once by moving to the next generation, a page of an older generation
+# reads as zeros and is reallocated on the next write. Indexed like a list (negative indices count from the end)
+class PagedMemory(object):
+    def __init__(self, size, page_bits=PAGE_BITS):
+        self._size = size
+        self._page_bits = page_bits
+        self._page_size = 1 << page_bits
+        self._page_mask = self._page_size - 1
+        self._generation = 0
+        # page number -> [generation, cells]
+        self._pages = {}
+
+    def __len__(self):
+        return self._size
+
+    def _index(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('memory index out of range')
+        return index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(map(self.__getitem__, range(*index.indices(self._size))))
+        index = self._index(index)
+        page = self._pages.get(index >> self._page_bits)
+        if page is None or page[0] != self._generation:
+            return 0
+        return page[1][index & self._page_mask]
+
+    def __setitem__(self, index, value):
+        index = self._index(index)
+        page = self._pages.get(index >> self._page_bits)
+        if page is None or page[0] != self._generation:
+            page = [self._generation, [0] * self._page_size]
+            self._pages[index >> self._page_bits] = page
+        page[1][index & self._page_mask] = value
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def reset(self):
+        self._generation += 1
+
@@ -1,31 +1,77 @@
 import datetime
 import time
 
+from pycpu.mips import blocks, fast
 from pycpu.mips.instructions import *
+from pycpu.mips.memory import PagedMemory
+from pycpu.mips.program import Program
+from pycpu.mips.util import wrap32
+
+ENGINES = ('objects', 'fast', 'blocks')
+MEMORY_BACKENDS = ('list', 'paged')
 
 
 class MIPS(Processor):
+    # engine:
+    #   'objects' - every instruction object executes itself
+    #   'fast' - the program is predecoded into flat int lists and executed by a single dispatch loop
+    #   'blocks' - the program is interpreted a basic block at a time, the hot loops are compiled into python functions
+    # memory:
+    #   'list' - a python list of cells
+    #   'paged' - PagedMemory, pages are allocated on write and reset in O(1)
+    #             (slower, saves the memory of large memories)
     def __init__(self,
                  mem_size=2048,
-                 reg_cnt=32):
+                 reg_cnt=32,
+                 engine='objects',
+                 memory='list'):
+        if engine not in ENGINES:
+            raise ValueError(f'unknown engine: {engine}')
+        if memory not in MEMORY_BACKENDS:
+            raise ValueError(f'unknown memory backend: {memory}')
         self._mem_size = mem_size
         self._reg_cnt = reg_cnt
+        self._engine = engine
+        self._memory_backend = memory
         self.memory = []
+        # the memory cells written since the last reset
+        self.written = set()
         self.registers = []
         self.instructions = []
+        self.steps = 0
+        self._predecoded = None
         self._pc = 0
         self._branch_offset = None
         self.reset()
 
+    # a list memory clears only the written cells (as much as the number of cells the program touched),
+    # a paged memory drops all the pages at once
     def reset(self):
-        self.memory = [0] * self._mem_size
+        if self._memory_backend == 'paged':
+            if isinstance(self.memory, PagedMemory) and len(self.memory) == self._mem_size:
+                self.memory.reset()
+            else:
+                self.memory = PagedMemory(self._mem_size)
+        elif isinstance(self.memory, list) and len(self.memory) == self._mem_size:
+            for cell in self.written:
+                self.memory[cell] = 0
+        else:
+            self.memory = [0] * self._mem_size
+        self.written = set()
         self.registers = [0] * self._reg_cnt
         self.instructions = []
+        self.steps = 0
+        self._predecoded = None
         self._pc = 0
         self._branch_offset = None
 
+    # instructions - a list of instructions or a Program
     def set_instructions(self, instructions):
+        if self._engine == 'objects' and isinstance(instructions, Program):
+            instructions = instructions.instructions()
         self.instructions = instructions
+        self.steps = 0
+        self._predecoded = None
         self._pc = 0
         self._branch_offset = None
 
@@ -44,9 +90,10 @@ class MIPS(Processor):
 
     def write_mem(self, addr, value):
         self.memory[addr >> 2] = value
+        self.written.add(addr >> 2)
 
     def write_reg(self, addr, value):
-        self.registers[addr] = value
+        self.registers[addr] = wrap32(value)
 
     def read_mem(self, addr):
         return self.memory[addr]
@@ -54,11 +101,33 @@ class MIPS(Processor):
     def read_reg(self, addr):
         return self.registers[addr]
 
+    # {cell: value} of the written cells that are not zero (negative cells are counted from the end, as in a list)
+    def memory_snapshot(self):
+        size = len(self.memory)
+        return dict((cell, self.memory[cell]) for cell in sorted(set(map(lambda x: x % size, self.written)))
+                    if self.memory[cell] != 0)
+
     def branch(self, offset):
         self._branch_offset = offset
 
-    # time_out - milliseconds
-    def run(self, time_out=None):
+    # time_out - milliseconds (the 'objects' engine only)
+    # max_steps - the maximum number of executed instructions
+    def run(self, time_out=None, max_steps=None):
+        if self._engine == 'fast':
+            if self._predecoded is None:
+                self._predecoded = fast.predecode(self.instructions)
+            self.steps = fast.run(self._predecoded, self.registers, self.memory, max_steps=max_steps,
+                                  written=self.written)
+            self._pc = len(self.instructions)
+            return
+        if self._engine == 'blocks':
+            if self._predecoded is None:
+                self._predecoded = blocks.translate(self.instructions)
+            self.steps = blocks.run(self._predecoded, self.registers, self.memory, max_steps=max_steps,
+                                    written=self.written)
+            self._pc = len(self.instructions)
+            return
+
         start_time = datetime.datetime.now()
 
         while 0 <= self._pc < len(self.instructions):
@@ -66,7 +135,10 @@ class MIPS(Processor):
                 now = datetime.datetime.now()
                 if (now - start_time).total_seconds() >= time_out / 1000:
                     raise TimeoutError('mips processor timeout...')
+            if max_steps is not None and self.steps >= max_steps:
+                raise TimeoutError('mips processor timeout...')
             self._current_instruction().execute(self)
             self._next_instruction()
+            self.steps += 1
 
 
@@ -0,0 +1,186 @@
+import sys
+from array import array
+
+from pycpu.mips.instructions import *
+
+# opcodes of the predecoded programs (see fast.py)
+OP_ADD = 0
+OP_SUB = 1
+OP_AND = 2
+OP_OR = 3
+OP_SLT = 4
+OP_ADDI = 5
+OP_LW = 6
+OP_SW = 7
+OP_BEQ = 8
+
+OPCODES = {
+    ADD: OP_ADD,
+    SUB: OP_SUB,
+    AND: OP_AND,
+    OR: OP_OR,
+    SLT: OP_SLT,
+    ADDI: OP_ADDI,
+    LW: OP_LW,
+    SW: OP_SW,
+    BEQ: OP_BEQ,
+}
+
+# instruction classes by predecoded opcode
+CLASSES = dict(map(lambda x: (x[1], x[0]), OPCODES.items()))
+
+# the opcode (bits 31..26) and the funct (bits 5..0, R-type only) fields of every instruction
+OPCODE_FIELDS = {
+    OP_ADD: (0b000000, 0b100000),
+    OP_SUB: (0b000000, 0b100010),
+    OP_AND: (0b000000, 0b100100),
+    OP_OR: (0b000000, 0b100101),
+    OP_SLT: (0b000000, 0b101010),
+    OP_ADDI: (0b001000, 0),
+    OP_LW: (0b100011, 0),
+    OP_SW: (0b101011, 0),
+    OP_BEQ: (0b000100, 0),
+}
+
+# predecoded opcode by the opcode field (I-type) or by the funct field (R-type), -1 - unknown instruction
+_I_TYPE_TABLE = [-1] * 64
+_R_TYPE_TABLE = [-1] * 64
+for _op, (_opcode, _funct) in OPCODE_FIELDS.items():
+    if _op <= OP_SLT:
+        _R_TYPE_TABLE[_funct] = _op
+    else:
+        _I_TYPE_TABLE[_opcode] = _op
+
+
+# the machine word of a single instruction (see encode_fields)
+def _encode_word(op, rs, rt, arg):
+    opcode, funct = OPCODE_FIELDS[op]
+    low = ((arg & 0x1F) << 11) | funct if op <= OP_SLT else arg & 0xFFFF
+    return (opcode << 26) | ((rs & 0x1F) << 21) | ((rt & 0x1F) << 16) | low
+
+
+# the fields of a single machine word (see decode_fields)
+def _decode_word(word):
+    opcode = word >> 26
+    if opcode == 0:
+        return _R_TYPE_TABLE[word & 0x3F], (word >> 21) & 0x1F, (word >> 16) & 0x1F, (word >> 11) & 0x1F
+    imm = word & 0xFFFF
+    return _I_TYPE_TABLE[opcode], (word >> 21) & 0x1F, (word >> 16) & 0x1F, imm - 0x10000 if imm & 0x8000 else imm
+
+
+# packs predecoded fields (opcode, rs, rt and rd/imm, as produced by fields()) into 32-bit machine words,
+# vectorized over NumPy arrays of any shape (a single program is packed by _encode_word)
+def encode_fields(ops, rs, rt, args):
+    import numpy as np
+
+    ops = np.asarray(ops, dtype=np.int64)
+    rs = np.asarray(rs, dtype=np.int64)
+    rt = np.asarray(rt, dtype=np.int64)
+    args = np.asarray(args, dtype=np.int64)
+    opcode = np.array(list(map(lambda x: x[0], OPCODE_FIELDS.values())), dtype=np.int64)[ops]
+    funct = np.array(list(map(lambda x: x[1], OPCODE_FIELDS.values())), dtype=np.int64)[ops]
+    r_type = ops <= OP_SLT
+    low = np.where(r_type, ((args & 0x1F) << 11) | funct, args & 0xFFFF)
+    return ((opcode << 26) | ((rs & 0x1F) << 21) | ((rt & 0x1F) << 16) | low).astype(np.uint32)
+
+
+# splits 32-bit machine words into predecoded fields: (opcode, rs, rt, rd for R-type / sign extended imm for I-type),
+# vectorized over NumPy arrays of any shape (a single program is split by _decode_word)
+def decode_fields(words):
+    import numpy as np
+
+    words = np.asarray(words, dtype=np.int64)
+    opcode = words >> 26
+    ops = np.where(opcode == 0, np.array(_R_TYPE_TABLE)[words & 0x3F], np.array(_I_TYPE_TABLE)[opcode])
+    rs = (words >> 21) & 0x1F
+    rt = (words >> 16) & 0x1F
+    imm = words & 0xFFFF
+    imm = np.where(imm & 0x8000, imm - 0x10000, imm)
+    args = np.where(opcode == 0, (words >> 11) & 0x1F, imm)
+    return ops, rs, rt, args
+
+
+class Program(object):
+    # a program stored as packed 32-bit machine words (array('I'))
+    def __init__(self, words=()):
+        self.words = words if isinstance(words, array) and words.typecode == 'I' else array('I', words)
+
+    @staticmethod
+    def from_instructions(instructions):
+        if isinstance(instructions, Program):
+            return instructions
+        ops, rs, rt, args = [], [], [], []
+        for inst in instructions:
+            op = OPCODES.get(type(inst))
+            if op is None:
+                raise ValueError(f'unsupported instruction: {inst}')
+            ops.append(op)
+            rs.append(int(inst.rs))
+            rt.append(int(inst.rt))
+            if op <= OP_SLT:
+                args.append(int(inst.rd))
+            elif op == OP_ADDI:
+                args.append(int(inst.imm))
+            else:
+                args.append(int(inst.offset))
+        return Program.from_fields(ops, rs, rt, args)
+
+    @staticmethod
+    def from_fields(ops, rs, rt, args):
+        return Program(map(_encode_word, ops, rs, rt, args))
+
+    @staticmethod
+    def from_text(text, base=2):
+        return Program(map(lambda x: int(x, base), text.split()))
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return Program(self.words[item])
+        return self.words[item]
+
+    def __eq__(self, other):
+        return isinstance(other, Program) and self.words == other.words
+
+    def __hash__(self):
+        return hash(self.words.tobytes())
+
+    def fields(self):
+        if len(self.words) == 0:
+            return [], [], [], []
+        ops, rs, rt, args = map(list, zip(*map(_decode_word, self.words)))
+        if min(ops) < 0:
+            pc = ops.index(-1)
+            raise ValueError(f'unsupported instruction: {self.words[pc]:032b} (pc={pc})')
+        return ops, rs, rt, args
+
+    def instructions(self):
+        return list(map(lambda x: CLASSES[x[0]](x[1], x[2], x[3]), zip(*self.fields())))
+
+    def readmemb(self, breakpoint=True):
+        words = list(self.words) + ([0] if breakpoint else [])
+        return '\n'.join(map(lambda x: format(x, '032b'), words))
+
+    def readmemh(self, breakpoint=True):
+        words = list(self.words) + ([0] if breakpoint else [])
+        return '\n'.join(map(lambda x: format(x, '08x'), words))
+
+    def write_readmemb(self, path, breakpoint=True):
+        with open(path, 'w') as f:
+            f.write(self.readmemb(breakpoint))
+
+    def write_readmemh(self, path, breakpoint=True):
+        with open(path, 'w') as f:
+            f.write(self.readmemh(breakpoint))
+
+    # little-endian 32-bit words
+    def write_raw(self, path, breakpoint=True):
+        words = array('I', self.words)
+        if breakpoint:
+            words.append(0)
+        if sys.byteorder == 'big':
+            words.byteswap()
+        with open(path, 'wb') as f:
+            f.write(words.tobytes())
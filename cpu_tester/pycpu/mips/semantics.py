@@ -0,0 +1,143 @@
+from pycpu.mips.program import *
+
+# the semantics of the predecoded instructions, the single definition every engine is generated from
+# (fast.py, blocks.py, batch.py and coverage.py; the 'objects' engine is the reference they are checked against).
+# The expressions are python source of the operands {a} (the value of rs), {b} (the value of rt),
+# {c} (the immediate) and {load} (the memory cell read by a lw), valid for ints as well as for NumPy arrays
+
+# the value written to a register
+VALUES = {
+    OP_ADD: '{a} + {b}',
+    OP_SUB: '{a} - {b}',
+    OP_AND: '{a} & {b}',
+    OP_OR: '{a} | {b}',
+    OP_SLT: '({a} < {b}) * 1',
+    OP_ADDI: '{a} + {c}',
+    OP_LW: '{load}',
+}
+# the values that can leave the 32-bit range (the others are computed from 32-bit values)
+WRAPPED = (OP_ADD, OP_SUB, OP_ADDI)
+# the field of the written register: 'arg' (rd of the R-type instructions) or 'rt'
+WRITES = {
+    OP_ADD: 'arg',
+    OP_SUB: 'arg',
+    OP_AND: 'arg',
+    OP_OR: 'arg',
+    OP_SLT: 'arg',
+    OP_ADDI: 'rt',
+    OP_LW: 'rt',
+}
+# the memory cell of a lw/sw, the value stored by a sw and the condition of a beq (the target is pc + {c} + 1)
+ADDRESS = '({a} + {c}) >> 2'
+STORED = '{b}'
+TAKEN = '{a} == {b}'
+
+# the if/elif chain of the interpreters tests the most frequent instructions first
+DISPATCH_ORDER = (OP_ADDI, OP_ADD, OP_SUB, OP_AND, OP_OR, OP_SLT, OP_LW, OP_SW, OP_BEQ)
+
+
+def wrap(expr):
+    return f'(({expr} + 0x80000000) & 0xFFFFFFFF) - 0x80000000'
+
+
+def value(op, a, b, c, load):
+    expr = VALUES[op].format(a=a, b=b, c=c, load=load)
+    return wrap(expr) if op in WRAPPED else expr
+
+
+def address(a, c):
+    return ADDRESS.format(a=a, c=c)
+
+
+# True if the instruction reads rt (every instruction reads rs)
+def reads_rt(op):
+    expr = {OP_SW: STORED, OP_BEQ: TAKEN}.get(op, VALUES.get(op, ''))
+    return '{b}' in expr
+
+
+# the python statements (lines) of an instruction: rs, rt and arg - the source of its fields,
+# register - formats the source of a register from the source of a field, memory and written - the source
+# of the memory and of the set of the written cells, taken - the statements of a taken beq
+def statements(op, rs, rt, arg, register, memory, written, taken):
+    a, b = register(rs), register(rt)
+    if op == OP_SW:
+        return [f'c = {address(a, arg)}', f'{memory}[c] = {STORED.format(b=b)}', f'{written}.add(c)']
+    if op == OP_BEQ:
+        return [f'if {TAKEN.format(a=a, b=b)}:'] + list(map(lambda x: '    ' + x, taken))
+    target = register(arg if WRITES[op] == 'arg' else rt)
+    return [f'{target} = {value(op, a, b, arg, f"{memory}[{address(a, arg)}]")}']
+
+
+# an if/elif chain on the source of the opcode that executes the instructions of codes (see statements), indented
+def dispatch(op, rs, rt, arg, register, memory, written, taken, indent, codes=DISPATCH_ORDER):
+    lines = []
+    for i, code in enumerate(codes):
+        lines.append(f'{"if" if i == 0 else "elif"} {op} == {code}:')
+        lines.extend(map(lambda x: '    ' + x, statements(code, rs, rt, arg, register, memory, written, taken)))
+    return list(map(lambda x: ' ' * indent + x, lines))
+
+
+# defines the function name of the python source, in the globals of a module (scope) or in its own namespace
+def define(source, name, scope=None):
+    namespace = {} if scope is None else scope
+    exec(compile(source, f'<mips {name}>', 'exec'), namespace)
+    return namespace[name]
+
+
+# the semantics as python functions (of ints or of NumPy arrays): the value written by every register writer,
+# the memory cell, the stored value and the condition of a beq
+def _function(expr, arguments='a, b, c, load'):
+    return eval(f'lambda {arguments}: ' + expr.format(a='a', b='b', c='c', load='load'))
+
+
+EVALUATE = dict(map(lambda op: (op, _function(value(op, '{a}', '{b}', '{c}', '{load}'))), VALUES))
+# the values before the wrapping (EVALUATE_WRAP of any of them is the value of EVALUATE, see WRAPPED)
+EVALUATE_UNWRAPPED = dict(map(lambda op: (op, _function(VALUES[op])), VALUES))
+EVALUATE_WRAP = _function(wrap('x'), 'x')
+EVALUATE_ADDRESS = _function(ADDRESS, 'a, c')
+EVALUATE_STORED = _function(STORED, 'a, b')
+EVALUATE_TAKEN = _function(TAKEN, 'a, b')
+
+
+def _execute_source():
+    a, b, c = 'registers[rs[pc]]', 'registers[rt[pc]]', 'args[pc]'
+    lines = []
+    for i, op in enumerate(DISPATCH_ORDER):
+        lines.append(f'{"if" if i == 0 else "elif"} op == {op}:')
+        cell = 'None'
+        if op == OP_LW or op == OP_SW:
+            lines.append(f'    cell = ({address(a, c)}) % mem_size')
+            cell = 'cell'
+        if op == OP_SW:
+            lines.append(f'    memory[cell] = {STORED.format(b=b)}')
+            lines.append(f'    yield pc, {op}, None, cell, None')
+        elif op == OP_BEQ:
+            lines.append(f'    taken = {TAKEN.format(a=a, b=b)}')
+            lines.append(f'    yield pc, {op}, None, None, taken')
+            lines.append('    if taken:')
+            lines.append(f'        pc += {c}')
+        else:
+            lines.append(f'    target = {c if WRITES[op] == "arg" else "rt[pc]"}')
+            lines.append(f'    registers[target] = {value(op, a, b, c, "memory[cell]")}')
+            lines.append(f'    yield pc, {op}, target, {cell}, None')
+    return '\n'.join([
+        'def execute(program, reg_cnt, mem_size, max_steps=None):',
+        '    ops, rs, rt, args = program.ops, program.rs, program.rt, program.args',
+        '    registers, memory = [0] * reg_cnt, [0] * mem_size',
+        '    n = len(ops)',
+        '    pc = 0',
+        '    step = 0',
+        '    limit = -1 if max_steps is None else max_steps',
+        '    while 0 <= pc < n and step != limit:',
+        '        op = ops[pc]',
+        *map(lambda x: '        ' + x, lines),
+        '        pc += 1',
+        '        step += 1',
+    ])
+
+
+# executes a predecoded program on zeroed registers and memory (the memory cells wrap modulo mem_size)
+# one instruction at a time and yields (pc, op, written register or None, accessed memory cell or None,
+# taken or None for the other instructions than beq) after every executed instruction,
+# for the analyses that follow the execution (coverage.trace, fast.last_writers)
+execute = define(_execute_source(), 'execute')
@@ -17,6 +17,36 @@ DEFAULT_CONFIG = {
     'memory_array_name': None,
     'registers_array_name': None,
     'instructions_array_name': None,
+    'simulator_mode': 'spawn',
+    'multi_cpu_test_path': './cpu/cpu_test_multi.v',
+    'instances_per_run': 1,
+    'worker_mode': 'thread',
+    'emulator_engine': 'fast',
+    'emulator_max_steps': 1000000,
+    'emulator_batch_size': 2048,
+    'cycle_slack': 2.0,
+    'cycle_margin': 16,
+    'program_generator': 'scalar',
+    'generator_batch_size': 256,
+    'dump_format': 'hex',
+    'emulator_memory': 'list',
+    'minimize_failures': 8,
+    'minimize_max_tests': 500,
+    'minimize_max_steps': 20000,
+    'failures_per_signature': 3,
+    'stop_on_saturation': None,
+    'coverage': False,
+    'coverage_update_interval': 16,
+    'corpus_folder': '../programs_samples',
+    'seed': None,
+    'result_store': None,
+    'store_batch_size': 256,
+    'mem_op_ratio': 0.4,
+    'loop_probability': 0.2,
+    'metrics': False,
+    'stats_interval': 10,
+    'metrics_file': None,
+    'replay_folders': None,
 }
 
 
@@ -52,7 +82,37 @@ class Config(object):
                  workers,
                  memory_array_name,
                  registers_array_name,
-                 instructions_array_name
+                 instructions_array_name,
+                 simulator_mode,
+                 multi_cpu_test_path,
+                 instances_per_run,
+                 worker_mode,
+                 emulator_engine,
+                 emulator_max_steps,
+                 emulator_batch_size,
+                 cycle_slack,
+                 cycle_margin,
+                 program_generator,
+                 generator_batch_size,
+                 dump_format,
+                 emulator_memory,
+                 minimize_failures,
+                 minimize_max_tests,
+                 minimize_max_steps,
+                 failures_per_signature,
+                 stop_on_saturation,
+                 coverage,
+                 coverage_update_interval,
+                 corpus_folder,
+                 seed,
+                 result_store,
+                 store_batch_size,
+                 mem_op_ratio,
+                 loop_probability,
+                 metrics,
+                 stats_interval,
+                 metrics_file,
+                 replay_folders
     ):
         self.cpu_test_path = cpu_test_path
         self.cpu_folder = cpu_folder
@@ -69,4 +129,70 @@ class Config(object):
         self.memory_array_name = memory_array_name
         self.registers_array_name = registers_array_name
         self.instructions_array_name = instructions_array_name
-
+        # 'spawn' - a new vvp process per program, 'server' - a long-lived vvp process per worker
+        self.simulator_mode = simulator_mode
+        # the test bench used when several cpus are simulated by one vvp run (instances_per_run > 1)
+        self.multi_cpu_test_path = multi_cpu_test_path
+        self.instances_per_run = instances_per_run
+        # 'thread' - workers are threads of the tester process, 'process' - every worker is a separate process
+        self.worker_mode = worker_mode
+        # see MIPS for the engines ('batch' - BatchMIPS runs up to emulator_batch_size jobs in lock-step,
+        # they are simulated instances_per_run at a time),
+        # the emulator gives up after emulator_max_steps executed instructions
+        self.emulator_engine = emulator_engine
+        self.emulator_max_steps = emulator_max_steps
+        self.emulator_batch_size = emulator_batch_size
+        # the verilog cpu may run (emulated instructions * cycle_slack + cycle_margin) cycles
+        # before the program is failed with a timeout (cycle_slack=null - only the time_out wall clock limit)
+        self.cycle_slack = cycle_slack
+        self.cycle_margin = cycle_margin
+        # 'scalar' - ProgramGenerator, 'bulk' - BulkProgramGenerator (numpy, generator_batch_size programs at once),
+        # 'coverage' - CoverageGuidedGenerator (biased towards the coverage bins not hit yet),
+        # 'corpus' - MutationFuzzer (mutates the programs of corpus_folder, fails_folder and the interesting ones)
+        self.program_generator = program_generator
+        self.generator_batch_size = generator_batch_size
+        # the format of the simulator dumps: 'binary' - a '<index> <bits>' line per cell, 'hex' - a line per array,
+        # 'sparse' - only the written non-zero memory cells (for large memories)
+        self.dump_format = dump_format
+        # the memory backend of the emulator: 'list' or 'paged' (see MIPS)
+        self.emulator_memory = emulator_memory
+        # the first failed program of every signature (up to minimize_failures programs) is reduced
+        # (ddmin, at most minimize_max_tests runs per program) to a minimal reproducer saved next to the original
+        # ({tag}_min_bin, {tag}_min_asm), a reduced program keeps the signature of the failure;
+        # the reduced programs are emulated for at most minimize_max_steps instructions instead of emulator_max_steps
+        # (removing instructions often leaves an endless loop)
+        self.minimize_failures = minimize_failures
+        self.minimize_max_tests = minimize_max_tests
+        self.minimize_max_steps = minimize_max_steps
+        # failures are grouped by signature (the message, the first divergent register/cell and its last writer),
+        # only the first failures_per_signature failures of a signature are saved and printed
+        self.failures_per_signature = failures_per_signature
+        # stop the run once every signature has all its failures saved and no new signature was found
+        # in the last stop_on_saturation tests (null - never stop early)
+        self.stop_on_saturation = stop_on_saturation
+        # trace the functional coverage of the programs (see pycpu/mips/coverage.py) and print a report,
+        # always on with the 'coverage' and 'corpus' generators, which is reweighted every coverage_update_interval programs
+        self.coverage = coverage
+        self.coverage_update_interval = coverage_update_interval
+        # the seeds of the 'corpus' generator ('.dat' files, the '_bin' failures of fails_folder are added as well)
+        self.corpus_folder = corpus_folder
+        # the seed of the run, the program of every test is a function of the seed and the id of the test
+        # (null - a random seed, printed at the start)
+        self.seed = seed
+        # the sqlite database the results are written to (see store.py, null - no store),
+        # by batches of store_batch_size results; a run interrupted with a store can be resumed (tester.py --resume)
+        self.result_store = result_store
+        self.store_batch_size = store_batch_size
+        # the share of the memory ops and the probability of a loop in the generated programs
+        self.mem_op_ratio = mem_op_ratio
+        self.loop_probability = loop_probability
+        # collect the latency histograms of the phases of the tests (generation, emulation, the simulator runs,
+        # the decoding of the dumps, the comparison), the queue depths and the worker utilization;
+        # a [STATS] line is printed every stats_interval seconds and exported to metrics_file
+        # ('.prom' - the Prometheus text format, json otherwise, null - no export)
+        self.metrics = metrics
+        self.stats_interval = stats_interval
+        self.metrics_file = metrics_file
+        # replay the programs of the '.dat' and '_bin' files of these folders instead of generating them
+        # (see replay.py, a job per program, null - no replay)
+        self.replay_folders = replay_folders
@@ -0,0 +1,227 @@
+import glob
+import os
+import random
+import threading
+
+from pycpu.mips import fast
+from pycpu.mips.program import *
+from pycpu.mips.tests.program_generator import ProgramGenerator, job_seed
+
+R_TYPE_OPS = (OP_ADD, OP_SUB, OP_AND, OP_OR, OP_SLT)
+
+
+# the programs of the '.dat' files ($readmemb, the test samples) and the '_bin' files (the saved failures)
+# of the folders, a program ends at its first zero word (the breakpoint), unreadable files are skipped
+def load_programs(folders):
+    programs = []
+    for folder in folders:
+        if folder is None or not os.path.isdir(folder):
+            continue
+        paths = glob.glob(os.path.join(folder, '*.dat')) + glob.glob(os.path.join(folder, '*_bin'))
+        for path in sorted(paths):
+            try:
+                with open(path) as f:
+                    words = list(Program.from_text(f.read()).words)
+                if 0 in words:
+                    words = words[:words.index(0)]
+                program = Program(words)
+                program.fields()
+            except (OSError, ValueError):
+                continue
+            if len(program) > 0:
+                programs.append(program)
+    return programs
+
+
+# the targets of the branches: [(branch, target)], the target of a beq at i is i + offset + 1
+def _branches(ops, args):
+    return [(i, i + args[i] + 1) for i in range(len(ops)) if ops[i] == OP_BEQ]
+
+
+# the positions (0..n) a program can be cut at without splitting a loop (no backward beq jumps over them)
+def _cut_points(ops, args):
+    backward = [(target, i) for i, target in _branches(ops, args) if target <= i]
+    return [p for p in range(len(ops) + 1) if not any(map(lambda x: x[0] < p <= x[1], backward))]
+
+
+# mutates the programs of a corpus: the seeds (see load_programs) and every program that hit a new coverage bin
+# or failed with a new signature (observe), so the neighbourhood of the interesting programs is explored
+# instead of starting over from a random program every time. The mutants are checked on the emulator first,
+# the ones that fail there (a memory access out of range, too many steps) are never tested.
+# A ProgramGenerator program is used when the corpus is empty, every FRESH_PROBABILITY programs
+# and when MAX_ATTEMPTS mutants in a row are rejected
+class MutationFuzzer(object):
+    FRESH_PROBABILITY = 0.1
+    MAX_ATTEMPTS = 8
+    MAX_MUTATIONS = 4
+
+    def __init__(self,
+                 memory_cells,
+                 amount=64,
+                 reg_range=(1, 10),
+                 seeds=(),
+                 max_steps=50000,
+            ):
+        self._memory_cells = memory_cells
+        self._amount = amount
+        self._reg_range = reg_range
+        self._max_steps = max_steps
+        self._fresh = ProgramGenerator(memory_cells, amount, reg_range)
+        self._corpus = []
+        self._known = set()
+        # the coverage bins (a coverage.trace mask) and the failure signatures seen so far
+        self._covered = 0
+        self._signatures = set()
+        # observe() is called by the workers while the producer thread is mutating
+        self._lock = threading.Lock()
+        for program in seeds:
+            self.add(program[:amount])
+
+    def __len__(self):
+        return len(self._corpus)
+
+    def _valid(self, program):
+        if not 0 < len(program) <= self._amount:
+            return False
+        try:
+            fast.run(fast.predecode(program), [0] * 32, [0] * self._memory_cells, max_steps=self._max_steps)
+        except Exception:
+            return False
+        return True
+
+    def add(self, program: Program):
+        with self._lock:
+            if program in self._known:
+                return False
+            self._known.add(program)
+        if not self._valid(program):
+            return False
+        with self._lock:
+            self._corpus.append(program)
+        return True
+
+    # keeps the program if its result hit a coverage bin or a failure signature that was not seen before
+    # (the emulator errors are not signatures of the cpu)
+    def observe(self, program, result):
+        program = Program.from_instructions(program)
+        interesting = False
+        with self._lock:
+            if result.coverage is not None and result.coverage & ~self._covered:
+                self._covered |= result.coverage
+                interesting = True
+            if not result.is_ok() and result.source != 'cpu' and result.signature not in self._signatures:
+                self._signatures.add(result.signature)
+                interesting = True
+        return interesting and self.add(program)
+
+    def _random_register(self, rng):
+        return rng.randint(self._reg_range[0], self._reg_range[1])
+
+    # an R-type op becomes another R-type op, lw becomes sw and back
+    def _swap_opcode(self, rng, ops, rs, rt, args):
+        candidates = [i for i in range(len(ops)) if ops[i] in R_TYPE_OPS or ops[i] in (OP_LW, OP_SW)]
+        if len(candidates) == 0:
+            return None
+        i = rng.choice(candidates)
+        if ops[i] in R_TYPE_OPS:
+            ops[i] = rng.choice([op for op in R_TYPE_OPS if op != ops[i]])
+        else:
+            ops[i] = OP_SW if ops[i] == OP_LW else OP_LW
+        return ops, rs, rt, args
+
+    # a register of an instruction, the base registers of lw/sw are kept (they hold the address setup)
+    def _perturb_register(self, rng, ops, rs, rt, args):
+        candidates = [i for i in range(len(ops)) if ops[i] != OP_BEQ]
+        if len(candidates) == 0:
+            return None
+        i = rng.choice(candidates)
+        if ops[i] in R_TYPE_OPS:
+            field = rng.choice((rs, rt, args))
+        elif ops[i] == OP_ADDI:
+            field = rng.choice((rs, rt))
+        else:
+            field = rt
+        field[i] = self._random_register(rng)
+        return ops, rs, rt, args
+
+    # an addi constant is nudged or replaced, a lw/sw gets another cell
+    def _perturb_immediate(self, rng, ops, rs, rt, args):
+        candidates = [i for i in range(len(ops)) if ops[i] in (OP_ADDI, OP_LW, OP_SW)]
+        if len(candidates) == 0:
+            return None
+        i = rng.choice(candidates)
+        if ops[i] == OP_ADDI:
+            if rng.random() < 0.5:
+                args[i] = max(min(args[i] + rng.randint(-8, 8), 0x7FFF), -0x8000)
+            else:
+                args[i] = rng.randint(0, 20000)
+        else:
+            args[i] = 4 * rng.randrange(self._memory_cells)
+        return ops, rs, rt, args
+
+    # the beginning of the program followed by the end of another corpus program, both cut outside the loops
+    def _splice(self, rng, ops, rs, rt, args):
+        with self._lock:
+            other = rng.choice(self._corpus)
+        other_ops, other_rs, other_rt, other_args = other.fields()
+        x = rng.choice(_cut_points(ops, args))
+        y = rng.choice(_cut_points(other_ops, other_args))
+        return ops[:x] + other_ops[y:], rs[:x] + other_rs[y:], rt[:x] + other_rt[y:], args[:x] + other_args[y:]
+
+    # the body of a loop (a backward beq) is repeated: a copy is inserted before the beq,
+    # every branch still jumps to its original target (the copies of the branches inside the body jump
+    # inside the copy)
+    def _duplicate_loop(self, rng, ops, rs, rt, args):
+        loops = [(i, target) for i, target in _branches(ops, args) if 0 <= target <= i]
+        if len(loops) == 0:
+            return None
+        end, start = rng.choice(loops)
+        length = end - start
+        n = len(ops)
+
+        # new position of an original instruction (n - the end of the program)
+        def position(x):
+            return x if x < end else x + length
+
+        new_args = list(args)
+        for i, target in _branches(ops, args):
+            new_args[i] = position(min(max(target, 0), n)) - position(i) - 1
+        copy_args = []
+        for i in range(start, end):
+            if ops[i] != OP_BEQ:
+                copy_args.append(args[i])
+                continue
+            target = min(max(i + args[i] + 1, 0), n)
+            at = end + i - start
+            copy_args.append((end + target - start if start <= target < end else position(target)) - at - 1)
+        return (ops[:end] + ops[start:end] + ops[end:],
+                rs[:end] + rs[start:end] + rs[end:],
+                rt[:end] + rt[start:end] + rt[end:],
+                new_args[:end] + copy_args + new_args[end:])
+
+    def mutate(self, program: Program, rng=random):
+        fields = program.fields()
+        mutations = [self._swap_opcode, self._perturb_register, self._perturb_immediate, self._splice,
+                     self._duplicate_loop]
+        for _ in range(rng.randint(1, MutationFuzzer.MAX_MUTATIONS)):
+            mutated = rng.choice(mutations)(rng, *map(list, fields))
+            if mutated is not None:
+                fields = mutated
+        return Program.from_fields(*fields)
+
+    def generate_program(self, rng=random):
+        with self._lock:
+            parent = rng.choice(self._corpus) if len(self._corpus) > 0 else None
+        if parent is not None and rng.random() >= MutationFuzzer.FRESH_PROBABILITY:
+            for _ in range(MutationFuzzer.MAX_ATTEMPTS):
+                mutant = self.mutate(parent, rng)
+                if mutant not in self._known and self._valid(mutant):
+                    return mutant
+        return self._fresh.generate_program(rng)
+
+    # the mutations depend on the corpus, so only the programs of the same corpus can be regenerated
+    def generate_job(self, run_seed, job_id):
+        return self.generate_program(random.Random(job_seed(run_seed, job_id)))
+
+    def generate(self):
+        return self.generate_program().instructions()
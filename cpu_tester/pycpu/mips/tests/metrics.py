@@ -0,0 +1,159 @@
+import json
+import os
+
+# the upper bounds of the histogram buckets in seconds: 100us .. ~13s, doubling (and +Inf)
+BUCKETS = tuple(0.0001 * 2 ** i for i in range(18))
+
+
+class Histogram(object):
+    def __init__(self, counts=None, total=0.0):
+        self.counts = [0] * (len(BUCKETS) + 1) if counts is None else counts
+        self.total = total
+
+    def add(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += seconds
+
+    def merge(self, other):
+        self.counts = list(map(sum, zip(self.counts, other.counts)))
+        self.total += other.total
+
+    def count(self):
+        return sum(self.counts)
+
+    # the upper bound of the bucket of the p-th percentile (None - no values, inf - above the last bucket)
+    def percentile(self, p):
+        count = self.count()
+        if count == 0:
+            return None
+        rank = p / 100 * count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else float('inf')
+        return float('inf')
+
+
+# the latency histograms of the phases of the tests (see the worker and VerilogApi), a disabled instance
+# ignores everything. Every worker has its own instance and hands the collected values over with take()
+class Metrics(object):
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.phases = {}
+
+    def add(self, phase, seconds):
+        if not self.enabled:
+            return
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = Histogram()
+        histogram.add(seconds)
+
+    # the values collected since the last take (None - nothing), the instance starts over
+    def take(self):
+        if len(self.phases) == 0:
+            return None
+        phases, self.phases = self.phases, {}
+        return phases
+
+    def merge(self, phases):
+        for phase, histogram in phases.items():
+            if phase in self.phases:
+                self.phases[phase].merge(histogram)
+            else:
+                self.phases[phase] = Histogram(list(histogram.counts), histogram.total)
+
+    # the share of the worker time spent on the tests (not waiting for jobs)
+    def utilization(self):
+        busy = sum(map(lambda x: self.phases[x].total if x in self.phases else 0.0, ('generate', 'job')))
+        wait = self.phases['wait'].total if 'wait' in self.phases else 0.0
+        return None if busy + wait == 0 else busy / (busy + wait)
+
+
+def snapshot(metrics: Metrics, counters, queues):
+    return {
+        'counters': counters,
+        'queues': queues,
+        'utilization': metrics.utilization(),
+        'phases': dict(map(lambda x: (x[0], {
+            'count': x[1].count(),
+            'sum': x[1].total,
+            'p50': x[1].percentile(50),
+            'p99': x[1].percentile(99),
+            'buckets': x[1].counts,
+        }), sorted(metrics.phases.items()))),
+    }
+
+
+def _prometheus(data):
+    lines = [
+        '# HELP cpu_tester_tests_total The finished tests.',
+        '# TYPE cpu_tester_tests_total counter',
+        f'cpu_tester_tests_total{{status="passed"}} {data["counters"]["passed"]}',
+        f'cpu_tester_tests_total{{status="failed"}} {data["counters"]["failed"]}',
+        '# HELP cpu_tester_signatures The distinct failure signatures.',
+        '# TYPE cpu_tester_signatures gauge',
+        f'cpu_tester_signatures {data["counters"]["signatures"]}',
+        '# HELP cpu_tester_queue_depth The jobs and results waiting in the queues.',
+        '# TYPE cpu_tester_queue_depth gauge',
+    ]
+    for name, depth in data['queues'].items():
+        if depth is not None:
+            lines.append(f'cpu_tester_queue_depth{{queue="{name}"}} {depth}')
+    if data['utilization'] is not None:
+        lines.extend([
+            '# HELP cpu_tester_worker_utilization The share of the worker time spent on the tests.',
+            '# TYPE cpu_tester_worker_utilization gauge',
+            f'cpu_tester_worker_utilization {data["utilization"]}',
+        ])
+    lines.extend([
+        '# HELP cpu_tester_phase_seconds The latency of the phases of the tests.',
+        '# TYPE cpu_tester_phase_seconds histogram',
+    ])
+    for phase, histogram in data['phases'].items():
+        cumulative = 0
+        for bound, count in zip(list(BUCKETS) + ['+Inf'], histogram['buckets']):
+            cumulative += count
+            lines.append(f'cpu_tester_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+        lines.append(f'cpu_tester_phase_seconds_sum{{phase="{phase}"}} {histogram["sum"]}')
+        lines.append(f'cpu_tester_phase_seconds_count{{phase="{phase}"}} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+# a '.prom' file is written in the Prometheus text format (for the node exporter textfile collector),
+# any other file as json; the file is replaced atomically, so a reader never sees a partial file
+def export(path, data):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as f:
+        if path.endswith('.prom'):
+            f.write(_prometheus(data))
+        else:
+            json.dump(data, f, indent=4)
+    os.replace(temporary, path)
+
+
+def _milliseconds(seconds):
+    return 'inf' if seconds == float('inf') else f'{seconds * 1000:.1f}ms'
+
+
+# the periodic summary line of a run
+def format_stats(data):
+    counters = data['counters']
+    line = (f'[STATS] tests={counters["passed"] + counters["failed"]}/{counters["total"]} '
+            f'failed={counters["failed"]} passed={counters["passed"]} signatures={counters["signatures"]} '
+            f'rate={counters["rate"]:.1f}/s')
+    if counters['eta'] is not None:
+        line += f' eta={counters["eta"]:.0f}s'
+    queues = list(filter(lambda x: x[1] is not None, data['queues'].items()))
+    if len(queues) > 0:
+        line += ' queue=' + '/'.join(map(lambda x: str(x[1]), queues))
+    if data['utilization'] is not None:
+        line += f' util={100 * data["utilization"]:.0f}%'
+    phases = list(filter(lambda x: x[0] != 'wait', data['phases'].items()))
+    if len(phases) > 0:
+        line += ' p50: ' + ' '.join(map(lambda x: f'{x[0]}={_milliseconds(x[1]["p50"])}', phases))
+    return line
@@ -0,0 +1,93 @@
+from pycpu.mips.program import OP_BEQ, Program
+
+
+# the signature of a failure without a mismatch: who failed and the type of the message
+# (the details, like the text of an exception, may differ between the programs)
+def failure_kind(result):
+    return result.source, (result.reason or '').split(':')[0]
+
+
+# the program made of the kept instructions (sorted indices), every kept BEQ still jumps to its original target
+# or, if the target was removed, to the next kept instruction after it
+def reduce_program(program: Program, keep):
+    ops, rs, rt, args = program.fields()
+    n = len(ops)
+    # new index of every old index (the removed ones map to the next kept instruction)
+    remap = [0] * (n + 1)
+    remap[n] = len(keep)
+    position = len(keep)
+    kept = set(keep)
+    for i in range(n - 1, -1, -1):
+        if i in kept:
+            position -= 1
+        remap[i] = position
+
+    new_args = []
+    for i in keep:
+        if ops[i] == OP_BEQ:
+            target = min(max(i + args[i] + 1, 0), n)
+            new_args.append(remap[target] - remap[i] - 1)
+        else:
+            new_args.append(args[i])
+    return Program.from_fields(
+        list(map(lambda x: ops[x], keep)),
+        list(map(lambda x: rs[x], keep)),
+        list(map(lambda x: rt[x], keep)),
+        new_args
+    )
+
+
+# delta debugging (ddmin) over the instructions of a failing program, a reduced program has to fail
+# with the signature of the original failure. All the candidates of a step (the chunks and their complements)
+# are evaluated at once by evaluate(programs) -> results, so they run concurrently on the workers
+# of the test bench; the verdicts are memoized by program
+class Minimizer(object):
+    def __init__(self, evaluate, max_tests=500):
+        self._evaluate = evaluate
+        self._max_tests = max_tests
+        # program -> signature (None - passed)
+        self._verdicts = {}
+        self.tests = 0
+
+    def _signatures(self, programs):
+        missing = list(dict.fromkeys(filter(lambda x: x not in self._verdicts, programs)))
+        if len(missing) > 0:
+            self.tests += len(missing)
+            for program, result in zip(missing, self._evaluate(missing)):
+                self._verdicts[program] = None if result.is_ok() else result.signature
+        return list(map(lambda x: self._verdicts[x], programs))
+
+    @staticmethod
+    def _split(keep, n):
+        size, rest = divmod(len(keep), n)
+        chunks, start = [], 0
+        for i in range(n):
+            end = start + size + (1 if i < rest else 0)
+            chunks.append(keep[start:end])
+            start = end
+        return list(filter(len, chunks))
+
+    # returns the smallest program found that fails with the signature of the result of the program
+    def minimize(self, program: Program, result):
+        signature = result.signature
+        self.tests = 0
+        keep = list(range(len(program)))
+        n = 2
+        while len(keep) >= 2 and self.tests < self._max_tests:
+            chunks = Minimizer._split(keep, n)
+            complements = list(map(lambda c: [i for i in keep if i not in c], map(set, chunks)))
+            # with two chunks the complements are the chunks themselves
+            candidates = chunks + (complements if len(chunks) > 2 else [])
+            signatures = self._signatures(list(map(lambda x: reduce_program(program, x), candidates)))
+
+            found = next(filter(lambda x: signatures[x] == signature, range(len(candidates))), None)
+            if found is not None:
+                # a failing chunk restarts the search at the coarsest granularity,
+                # a failing complement keeps it (one chunk less)
+                n = 2 if found < len(chunks) else max(n - 1, 2)
+                keep = candidates[found]
+            elif n < len(keep):
+                n = min(2 * n, len(keep))
+            else:
+                break
+        return reduce_program(program, keep)
@@ -1,6 +1,8 @@
 import random
 
+from pycpu.mips import program as pg
 from pycpu.mips.instructions import *
+from pycpu.mips.program import Program
 
 ARITHMETIC_OPS = [
     ADD,
@@ -16,71 +18,410 @@ MEM_OPS = [
 ]
 
 
+# the program of a job is a function of the seed of the run and the id of the job,
+# so any test can be regenerated from its id (and a run can be split into shards)
+def job_seed(run_seed, job_id):
+    return (run_seed << 32) + job_id
+
+
 class ProgramGenerator(object):
     def __init__(self,
                  memory_cells,
                  amount=64,
                  reg_range=(1, 10),
+                 mem_op_ratio=0.4,
+                 loop_probability=0.2,
             ):
         self._instructions_count = amount
         self.mem_cells = memory_cells
         self._reg_range = reg_range
+        self._mem_op_ratio = mem_op_ratio
+        self._loop_probability = loop_probability
 
-    def _random_register(self):
-        return random.choice(range(self._reg_range[0], self._reg_range[1] + 1))
+    def _random_register(self, rng):
+        return rng.choice(range(self._reg_range[0], self._reg_range[1] + 1))
 
-    def _random_arithmetic_op(self):
-        op = random.choice(ARITHMETIC_OPS)
-        rs, rt, rd = self._random_register(), self._random_register(), self._random_register()
+    def _random_arithmetic_op(self, rng):
+        op = rng.choice(ARITHMETIC_OPS)
+        rs, rt, rd = self._random_register(rng), self._random_register(rng), self._random_register(rng)
         return [op(rs, rt, rd)]
 
-    def _random_mem_op(self):
+    def _random_mem_op(self, rng):
         instructions = []
-        mem_cell_offset = 4 * random.choice(range(0, self.mem_cells // 4))
-        register = self._random_register()
+        mem_cell_offset = 4 * rng.choice(range(0, self.mem_cells // 4))
+        register = self._random_register(rng)
         instructions.append(ADDI(0, register, 0))
-        instructions.append(random.choice(MEM_OPS)(register, self._random_register(), mem_cell_offset))
+        instructions.append(rng.choice(MEM_OPS)(register, self._random_register(rng), mem_cell_offset))
         return instructions
 
-    def _add_constants_op(self):
-        const = random.randint(0, 20000)
-        return [ADDI(self._random_register(), self._random_register(), const)]
+    def _add_constants_op(self, rng):
+        const = rng.randint(0, 20000)
+        return [ADDI(self._random_register(rng), self._random_register(rng), const)]
+
+    # a constant, a memory op (the address setup and the lw/sw) or an arithmetic op
+    def _generate_unit(self, rng, _seed=1):
+        if _seed % 4 == 0:
+            return self._add_constants_op(rng)
+        # 40% - memory op
+        # 60% - arithmetic op
+        if rng.random() < self._mem_op_ratio:
+            return self._random_mem_op(rng)
+        return self._random_arithmetic_op(rng)
 
-    def _generate_ordered_instructions(self, cnt, _seed=1):
+    def _generate_ordered_instructions(self, rng, cnt, _seed=1):
         instructions = []
         while len(instructions) < cnt:
-            if _seed % 4 == 0:
-                instructions.extend(self._add_constants_op())
-            else:
-                # 40% - memory op
-                # 60% - arithmetic op
-                if random.random() < 0.4:
-                    instructions.extend(self._random_mem_op())
-                else:
-                    instructions.extend(self._random_arithmetic_op())
+            instructions.extend(self._generate_unit(rng, _seed))
         return instructions[:cnt]
 
-    def _generate_loop(self, inner_instructions):
+    def _generate_loop(self, rng, inner_instructions):
         instructions = []
-        iters = random.randint(1, 40)
+        iters = rng.randint(1, 40)
         instructions.append(SUB(30, 30, 30))
         instructions.append(ADDI(30, 30, iters))
         instructions.append(ADDI(0, 31, 0))
         instructions.append(ADDI(31, 31, 1))
-        instructions.extend(self._generate_ordered_instructions(inner_instructions))
+        instructions.extend(self._generate_ordered_instructions(rng, inner_instructions))
         instructions.append(SLT(30, 31, 29))
         instructions.append(BEQ(0, 29, -inner_instructions-3))
         return instructions
 
-    def generate(self):
+    def generate(self, rng=random):
         instructions = []
         _seed = 0
         # 20% - loops
         while len(instructions) < self._instructions_count:
-            random.random()
-            if random.random() > 0.8:
-                instructions.extend(self._generate_loop(random.randint(3, 8)))
+            rng.random()
+            if rng.random() > 1 - self._loop_probability:
+                instructions.extend(self._generate_loop(rng, rng.randint(3, 8)))
             else:
-                instructions.extend(self._generate_ordered_instructions(1, _seed))
+                instructions.extend(self._generate_unit(rng, _seed))
             _seed += 1
-        return instructions[:self._instructions_count]
\ No newline at end of file
+        return instructions[:self._instructions_count]
+
+    def generate_program(self, rng=random):
+        return Program.from_instructions(self.generate(rng))
+
+    # every job draws from its own random.Random, so the jobs don't depend on the order (or the threads)
+    # they are generated in
+    def generate_job(self, run_seed, job_id):
+        return self.generate_program(random.Random(job_seed(run_seed, job_id)))
+
+
+# draws whole batches of programs at once with a numpy generator, the programs have the same structure
+# and distribution as the ones of ProgramGenerator and are returned as packed machine words
+# (numpy is imported only when the generator is used)
+class BulkProgramGenerator(object):
+    MAX_INNER_INSTRUCTIONS = 8
+
+    def __init__(self,
+                 memory_cells,
+                 amount=64,
+                 reg_range=(1, 10),
+                 mem_op_ratio=0.4,
+                 loop_probability=0.2,
+                 seed=None,
+                 batch_size=256,
+            ):
+        import numpy as np
+
+        self._instructions_count = amount
+        self.mem_cells = memory_cells
+        self._reg_range = reg_range
+        self._mem_op_ratio = mem_op_ratio
+        self._loop_probability = loop_probability
+        self._rng = np.random.default_rng(seed)
+        self._batch_size = batch_size
+        self._buffer = []
+        # the batch of generate_job: (run seed, batch number, programs)
+        self._batch = None
+
+    def _registers(self, shape):
+        return self._rng.integers(self._reg_range[0], self._reg_range[1] + 1, shape)
+
+    def _arithmetic_ops(self, shape):
+        return self._rng.integers(pg.OP_ADD, pg.OP_SLT + 1, shape)
+
+    def _inner_instructions(self, loops):
+        import numpy as np
+
+        # every loop body is cut from MAX_INNER_INSTRUCTIONS units, a unit is a memory op (the address setup
+        # and LW/SW, two instructions) or an arithmetic op (one instruction)
+        shape = (loops, self.MAX_INNER_INSTRUCTIONS)
+        width = 2 * self.MAX_INNER_INSTRUCTIONS
+        is_mem = self._rng.random(shape) < self._mem_op_ratio
+        start = np.cumsum(np.where(is_mem, 2, 1), axis=1) - np.where(is_mem, 2, 1)
+        rows = np.broadcast_to(np.arange(loops)[:, None], shape)
+
+        ops = np.zeros((loops, width), dtype=np.int64)
+        rs = np.zeros((loops, width), dtype=np.int64)
+        rt = np.zeros((loops, width), dtype=np.int64)
+        args = np.zeros((loops, width), dtype=np.int64)
+
+        base = self._registers(shape)
+        ops[rows, start] = np.where(is_mem, pg.OP_ADDI, self._arithmetic_ops(shape))
+        rs[rows, start] = np.where(is_mem, 0, self._registers(shape))
+        rt[rows, start] = np.where(is_mem, base, self._registers(shape))
+        args[rows, start] = np.where(is_mem, 0, self._registers(shape))
+
+        mem_rows, mem_start = rows[is_mem], start[is_mem] + 1
+        count = len(mem_rows)
+        ops[mem_rows, mem_start] = np.where(self._rng.random(count) < 0.5, pg.OP_LW, pg.OP_SW)
+        rs[mem_rows, mem_start] = base[is_mem]
+        rt[mem_rows, mem_start] = self._registers(count)
+        args[mem_rows, mem_start] = 4 * self._rng.integers(0, self.mem_cells // 4, count)
+        return ops, rs, rt, args
+
+    # returns a (count, amount) uint32 array, a program per row
+    def generate_words(self, count):
+        import numpy as np
+
+        n = self._instructions_count
+        # a program never has more than n units, every unit takes at least one instruction
+        shape = (count, n)
+        is_loop = self._rng.random(shape) < self._loop_probability
+        inner = self._rng.integers(3, self.MAX_INNER_INSTRUCTIONS + 1, shape)
+        is_const = (np.arange(n)[None, :] % 4) == 0
+        is_mem = self._rng.random(shape) < self._mem_op_ratio
+        length = np.where(is_loop, inner + 6, np.where(is_mem & ~is_const, 2, 1))
+        start = np.cumsum(length, axis=1) - length
+        used = start < n
+        rows = np.broadcast_to(np.arange(count)[:, None], shape)
+
+        width = n + self.MAX_INNER_INSTRUCTIONS + 6
+        ops = np.zeros((count, width), dtype=np.int64)
+        rs = np.zeros((count, width), dtype=np.int64)
+        rt = np.zeros((count, width), dtype=np.int64)
+        args = np.zeros((count, width), dtype=np.int64)
+
+        # single units: every 4th unit adds a constant, otherwise a memory op (the address setup and the lw/sw)
+        # or an arithmetic op
+        single = used & ~is_loop
+        unit_ops = np.where(is_const | is_mem, pg.OP_ADDI, self._arithmetic_ops(shape))
+        unit_rs = np.where(is_mem & ~is_const, 0, self._registers(shape))
+        unit_rt = self._registers(shape)
+        unit_args = np.where(is_const, self._rng.integers(0, 20001, shape),
+                             np.where(is_mem, 0, self._registers(shape)))
+        r, c = rows[single], start[single]
+        ops[r, c], rs[r, c], rt[r, c], args[r, c] = \
+            unit_ops[single], unit_rs[single], unit_rt[single], unit_args[single]
+        memory = single & is_mem & ~is_const
+        r, c = rows[memory], start[memory] + 1
+        ops[r, c] = np.where(self._rng.random(len(r)) < 0.5, pg.OP_LW, pg.OP_SW)
+        rs[r, c] = unit_rt[memory]
+        rt[r, c] = self._registers(len(r))
+        args[r, c] = 4 * self._rng.integers(0, self.mem_cells // 4, len(r))
+
+        # loops: the counter setup, the body and the exit check
+        loop = used & is_loop
+        r, c, k = rows[loop], start[loop], inner[loop]
+        iters = self._rng.integers(1, 41, len(r))
+        header = [
+            (pg.OP_SUB, 30, 30, 30),
+            (pg.OP_ADDI, 30, 30, iters),
+            (pg.OP_ADDI, 0, 31, 0),
+            (pg.OP_ADDI, 31, 31, 1),
+        ]
+        for i, (op, a, b, arg) in enumerate(header):
+            ops[r, c + i], rs[r, c + i], rt[r, c + i], args[r, c + i] = op, a, b, arg
+
+        body_ops, body_rs, body_rt, body_args = self._inner_instructions(len(r))
+        for i in range(self.MAX_INNER_INSTRUCTIONS):
+            m = i < k
+            at = c[m] + 4 + i
+            ops[r[m], at], rs[r[m], at], rt[r[m], at], args[r[m], at] = \
+                body_ops[m, i], body_rs[m, i], body_rt[m, i], body_args[m, i]
+
+        footer = [
+            (pg.OP_SLT, 30, 31, 29),
+            (pg.OP_BEQ, 0, 29, -k - 3),
+        ]
+        for i, (op, a, b, arg) in enumerate(footer):
+            at = c + 4 + k + i
+            ops[r, at], rs[r, at], rt[r, at], args[r, at] = op, a, b, arg
+
+        return pg.encode_fields(ops[:, :n], rs[:, :n], rt[:, :n], args[:, :n])
+
+    def generate_programs(self, count):
+        return list(map(lambda x: Program(x.tolist()), self.generate_words(count)))
+
+    # one program at a time (as ProgramGenerator), served from a buffer refilled by batch_size programs
+    def generate_program(self):
+        if not self._buffer:
+            self._buffer = self.generate_programs(self._batch_size)
+            self._buffer.reverse()
+        return self._buffer.pop()
+
+    # the jobs are generated by batches of batch_size consecutive ids, a batch is a function of the run seed
+    # and its number (the ids usually come in order, so a batch is generated once)
+    def generate_job(self, run_seed, job_id):
+        import numpy as np
+
+        number, index = divmod(job_id - 1, self._batch_size)
+        if self._batch is None or self._batch[:2] != (run_seed, number):
+            self._rng = np.random.default_rng([run_seed, number])
+            self._batch = (run_seed, number, self.generate_programs(self._batch_size))
+        return self._batch[2][index]
+
+    def generate(self):
+        return self.generate_program().instructions()
+
+
+# a ProgramGenerator aimed at the coverage bins (pycpu/mips/coverage.py) that were not hit yet:
+# update(coverage) reweights the opcodes (forward beqs included), picks the missing opcode pairs,
+# the read-after-write distances, the writes to $0 and the reuse of memory addresses
+class CoverageGuidedGenerator(ProgramGenerator):
+    BOOST = 0.2
+    HAZARD_PROBABILITY = 0.3
+
+    def __init__(self,
+                 memory_cells,
+                 amount=64,
+                 reg_range=(1, 10),
+                 mem_op_ratio=0.4,
+                 loop_probability=0.2,
+            ):
+        super().__init__(memory_cells, amount, reg_range, mem_op_ratio, loop_probability)
+        arithmetic = (1 - mem_op_ratio) / len(ARITHMETIC_OPS)
+        self._base_weights = {
+            pg.OP_ADD: arithmetic, pg.OP_SUB: arithmetic, pg.OP_AND: arithmetic, pg.OP_OR: arithmetic,
+            pg.OP_SLT: arithmetic, pg.OP_ADDI: 0.1, pg.OP_LW: mem_op_ratio / 2, pg.OP_SW: mem_op_ratio / 2,
+            pg.OP_BEQ: 0.05,
+        }
+        # (opcode weights, missing pairs, hazard distance weights, $0 write probability, address reuse probability),
+        # replaced as a whole by update() (the producer thread may be generating at the same time)
+        self._settings = (self._base_weights, [], [1.0, 1.0, 1.0], 0.0, 0.1)
+        self._pending = []
+        # the destination of the last instructions (None - no register written), the latest last
+        self._recent = []
+        # the registers known to hold 0 (set by 'addi $r, $0, 0'), usable as the base of a memory op
+        self._zeroed = set()
+        # the number of the next instructions a forward beq may skip (they can't set up a zeroed register)
+        self._unsafe = 0
+        self._offset = 0
+
+    def update(self, cov):
+        weights = dict(self._base_weights)
+        pairs, distances, zero, reuse = [], [0.1, 0.1, 0.1], 0.0, 0.1
+        for b in cov.missing():
+            if b[0] == 'pair':
+                pairs.append((b[1], b[2]))
+            elif b[0] == 'hazard':
+                weights[b[1]] += CoverageGuidedGenerator.BOOST
+                distances[b[2] - 1] += 1
+            elif b[0] == 'branch':
+                weights[pg.OP_BEQ] += CoverageGuidedGenerator.BOOST
+            elif b[0] == 'memory':
+                reuse = 0.7
+                if b[3]:
+                    pairs.append((b[1], b[2]))
+            elif b[0] == 'zero':
+                weights[b[1]] += CoverageGuidedGenerator.BOOST
+                zero = 0.3
+        self._settings = (weights, pairs, distances, zero, reuse)
+
+    def _source(self, rng, distances):
+        if rng.random() < CoverageGuidedGenerator.HAZARD_PROBABILITY:
+            d = rng.choices((1, 2, 3), distances)[0]
+            if len(self._recent) >= d and self._recent[-d]:
+                return self._recent[-d]
+        return self._random_register(rng)
+
+    # a recently zeroed register (a read right after its write) or $0
+    def _base(self, rng, distances):
+        if rng.random() < CoverageGuidedGenerator.HAZARD_PROBABILITY:
+            d = rng.choices((1, 2, 3), distances)[0]
+            if len(self._recent) >= d and self._recent[-d] in self._zeroed:
+                return self._recent[-d]
+        return 0
+
+    def _written(self, destination, zeroed=False):
+        if destination is not None:
+            self._zeroed.discard(destination)
+            if zeroed and destination != 0 and self._unsafe == 0:
+                self._zeroed.add(destination)
+        self._unsafe = max(self._unsafe - 1, 0)
+        self._recent = self._recent[-2:] + [destination]
+
+    # room - the number of instructions that follow in the same block (a loop body or a single unit),
+    # a forward beq does not leave the block (skipping the slt of a loop would make it endless),
+    # a write to $0 needs a following instruction to undo it
+    def _next_instruction(self, rng, room):
+        weights, pairs, distances, zero, reuse = self._settings
+        if room < 1:
+            zero = 0.0
+        if len(self._pending) > 0:
+            op = self._pending.pop()
+        elif len(pairs) > 0 and rng.random() < 0.5:
+            op, second = rng.choice(pairs)
+            self._pending.append(second)
+        else:
+            op = rng.choices(list(weights), list(weights.values()))[0]
+
+        destination = 0 if rng.random() < zero else self._random_register(rng)
+        zeroed = False
+        if op in (pg.OP_LW, pg.OP_SW):
+            if rng.random() >= reuse:
+                self._offset = 4 * rng.choice(range(0, self.mem_cells // 4))
+            # the base register holds 0, so the address is the offset
+            if op == pg.OP_LW:
+                instruction = LW(self._base(rng, distances), destination, self._offset)
+            else:
+                instruction = SW(self._base(rng, distances), self._source(rng, distances), self._offset)
+                destination = None
+        elif op == pg.OP_ADDI:
+            # a quarter of them set up a base register for the memory ops (as ProgramGenerator does)
+            zeroed = rng.random() < 0.25
+            if zeroed:
+                instruction = ADDI(0, destination, 0)
+            else:
+                instruction = ADDI(self._source(rng, distances), destination, rng.randint(0, 20000))
+        elif op == pg.OP_BEQ:
+            # forward only, so the branches never make a loop
+            offset = rng.randint(0, min(2, room))
+            instruction, destination = BEQ(self._source(rng, distances), self._source(rng, distances), offset), None
+        else:
+            instruction = pg.CLASSES[op](self._source(rng, distances), self._source(rng, distances), destination)
+        self._written(destination, zeroed)
+        if op == pg.OP_BEQ:
+            self._unsafe = instruction.offset
+        return instruction
+
+    def _generate_ordered_instructions(self, rng, cnt, _seed=1):
+        instructions = []
+        while len(instructions) < cnt:
+            if _seed % 4 == 0:
+                instructions.extend(self._add_constants_op(rng))
+                self._written(instructions[-1].rt)
+                continue
+            instruction = self._next_instruction(rng, room=cnt - len(instructions) - 1)
+            instructions.append(instruction)
+            # the emulator does not hardwire $0 (and the loops and the memory ops rely on it being 0),
+            # so a write to $0 is undone right away
+            if not isinstance(instruction, (SW, BEQ)) and self._recent[-1] == 0:
+                instructions.append(SUB(0, 0, 0))
+                self._written(None)
+        return instructions[:cnt]
+
+    # a single instruction chosen by the weights (a memory op takes one instruction here)
+    def _generate_unit(self, rng, _seed=1):
+        return self._generate_ordered_instructions(rng, 1, _seed)
+
+    # the registers of the body are written in every iteration, so nothing is known about them
+    # at the start of the body or after the loop
+    def _generate_loop(self, rng, inner_instructions):
+        self._recent, self._zeroed = [], set()
+        instructions = super()._generate_loop(rng, inner_instructions)
+        self._recent, self._zeroed = [], set()
+        return instructions
+
+    # a program depends only on rng and the settings of the last update()
+    def generate(self, rng=random):
+        self._recent, self._zeroed, self._unsafe = [], set(), 0
+        self._pending, self._offset = [], 0
+        instructions = super().generate(rng)
+        # a program cut in the middle of a loop body must not branch past the breakpoint right after it
+        for i, inst in enumerate(instructions):
+            if isinstance(inst, BEQ) and inst.offset >= 0 and i + 1 + inst.offset > len(instructions):
+                instructions[i] = BEQ(inst.rs, inst.rt, len(instructions) - i - 1)
+        return instructions
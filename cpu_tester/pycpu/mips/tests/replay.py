@@ -0,0 +1,97 @@
+import glob
+import os
+
+from pycpu.mips.program import Program, decode_fields
+
+
+# the '.dat' ($readmemb, the test samples) and the '_bin' (the saved failures) files of the folders,
+# sorted, a file is taken as it is
+def replay_paths(folders):
+    paths = []
+    seen = set()
+    for folder in folders:
+        if os.path.isfile(folder):
+            found = [folder]
+        else:
+            found = glob.glob(os.path.join(folder, '*.dat')) + glob.glob(os.path.join(folder, '*_bin'))
+        for path in sorted(found):
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+# the programs of $readmemb files of 32-bit words, decoded all at once: the binary digits of all the files
+# are packed into uint32 words by a single matrix product and split into fields by decode_fields
+# (lookup tables indexed by the opcode and funct bits). A program ends at its first zero word (the breakpoint).
+# Returns (programs, skipped): a Program or None per path and [(path, reason)] of the files that can't be replayed
+def load_replay(paths, max_length=None):
+    import numpy as np
+
+    programs = [None] * len(paths)
+    skipped = []
+    tokens = []
+    loaded = []
+    for i, path in enumerate(paths):
+        try:
+            with open(path, 'rb') as f:
+                words = f.read().replace(b'_', b'').split()
+        except OSError as ex:
+            skipped.append((path, str(ex)))
+            continue
+        if len(words) == 0:
+            skipped.append((path, 'empty program'))
+            continue
+        if set(map(len, words)) != {32}:
+            skipped.append((path, 'not a $readmemb file of 32-bit words'))
+            continue
+        tokens.extend(words)
+        loaded.append((i, len(words)))
+    if len(loaded) == 0:
+        return programs, skipped
+
+    bits = np.frombuffer(b''.join(tokens), dtype=np.uint8).reshape(-1, 32) - ord('0')
+    weights = (1 << np.arange(31, -1, -1, dtype=np.uint64)).astype(np.uint64)
+    words = (bits.astype(np.uint64) @ weights).astype(np.uint32)
+    ops = decode_fields(words)[0]
+    malformed = (bits > 1).any(axis=1)
+
+    # the first zero word and the first word that is not an instruction of every file
+    counts = np.array(list(map(lambda x: x[1], loaded)), dtype=np.int64)
+    starts = np.cumsum(counts) - counts
+    index = np.arange(len(words))
+    ends = np.minimum.reduceat(np.where((words == 0) & ~malformed, index, len(words)), starts)
+    ends = np.minimum(ends, starts + counts)
+    invalid = np.minimum.reduceat(np.where(malformed | (ops < 0), index, len(words)), starts)
+
+    for (i, _), start, end, bad in zip(loaded, starts.tolist(), ends.tolist(), invalid.tolist()):
+        if bad < end:
+            skipped.append((paths[i], f'unsupported word {tokens[bad].decode("ascii", errors="replace")} '
+                                      f'(pc={bad - start})'))
+        elif end == start:
+            skipped.append((paths[i], 'empty program'))
+        elif max_length is not None and end - start > max_length:
+            skipped.append((paths[i], f'{end - start} instructions, at most {max_length} fit the instruction memory'))
+        else:
+            programs[i] = Program(words[start:end].tolist())
+    return programs, skipped
+
+
+# serves the programs of the replayed files as jobs: the job i is the i-th program that could be loaded
+# (see load_replay), so a run (or a shard of it) can be resumed as long as the files stay the same
+class ReplayGenerator(object):
+    def __init__(self, folders, max_length=None):
+        paths = replay_paths(folders)
+        programs, self.skipped = load_replay(paths, max_length)
+        loaded = list(filter(lambda x: x[1] is not None, zip(paths, programs)))
+        self.paths = list(map(lambda x: x[0], loaded))
+        self._programs = list(map(lambda x: x[1], loaded))
+
+    def __len__(self):
+        return len(self._programs)
+
+    def path(self, job_id):
+        return self.paths[job_id - 1]
+
+    def generate_job(self, run_seed, job_id):
+        return self._programs[job_id - 1]
@@ -0,0 +1,95 @@
+import sqlite3
+import time
+
+
+# the results of a run in a sqlite database, a row per test: the job id, the seed of the run, the status,
+# the failure (source, message, signature) and the time of the simulator run that tested it.
+# The rows are written by batches (batch_size rows or flush_interval seconds, whichever comes first)
+# in one transaction, so a crash loses at most the last batch; the store belongs to a single run (seed)
+class ResultStore(object):
+    def __init__(self, path, batch_size=256, flush_interval=1.0):
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'job_id INTEGER PRIMARY KEY, seed INTEGER, status TEXT, source TEXT, message TEXT, signature TEXT, '
+            'seconds REAL)'
+        )
+        self._connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self._connection.commit()
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._pending = []
+        self._flushed_at = time.monotonic()
+
+    def seed(self):
+        row = self._connection.execute('SELECT value FROM meta WHERE key = \'seed\'').fetchone()
+        return None if row is None else int(row[0])
+
+    # binds the store to the run, the results of another run can't be mixed in
+    def open_run(self, seed):
+        stored = self.seed()
+        if stored is not None and stored != seed:
+            raise ValueError(f'the result store belongs to the run with seed {stored}, not {seed}')
+        self._connection.execute('INSERT OR REPLACE INTO meta VALUES (\'seed\', ?)', (str(seed),))
+        self._connection.commit()
+
+    def add(self, seed, result):
+        self._pending.append((
+            result.job_id,
+            seed,
+            'passed' if result.is_ok() else 'failed',
+            result.source,
+            result.reason,
+            result.signature,
+            getattr(result, 'seconds', None),
+        ))
+        if len(self._pending) >= self._batch_size or time.monotonic() - self._flushed_at >= self._flush_interval:
+            self.flush()
+
+    def flush(self):
+        if len(self._pending) > 0:
+            with self._connection:
+                self._connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                             self._pending)
+            self._pending = []
+        self._flushed_at = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    # the ids of the jobs that are not in the store yet: the committed ids are streamed in order,
+    # only the ones after the first missing id are kept in memory (the workers finish the jobs almost in order)
+    def pending(self, jobs):
+        cursor = self._connection.execute('SELECT job_id FROM results WHERE job_id BETWEEN ? AND ? ORDER BY job_id',
+                                          (jobs.start, jobs.stop - 1))
+        first = jobs.start
+        done = set()
+        for (job_id,) in cursor:
+            if job_id == first and len(done) == 0:
+                first += 1
+            else:
+                done.add(job_id)
+        return first, done
+
+    # (passed, failed, {signature: [failures, job ids of the first failures_limit failures]}) of the stored jobs
+    def counts(self, jobs, failures_limit):
+        bounds = (jobs.start, jobs.stop - 1)
+        passed, failed = 0, 0
+        for status, count in self._connection.execute(
+                'SELECT status, COUNT(*) FROM results WHERE job_id BETWEEN ? AND ? GROUP BY status', bounds):
+            if status == 'passed':
+                passed = count
+            else:
+                failed = count
+        signatures = {}
+        for signature, count in self._connection.execute(
+                'SELECT signature, COUNT(*) FROM results WHERE job_id BETWEEN ? AND ? AND status = \'failed\' '
+                'GROUP BY signature', bounds).fetchall():
+            first = self._connection.execute(
+                'SELECT job_id FROM results WHERE job_id BETWEEN ? AND ? AND signature = ? ORDER BY job_id LIMIT ?',
+                bounds + (signature, failures_limit)).fetchall()
+            signatures[signature] = [count, list(map(lambda x: x[0], first))]
+        return passed, failed, signatures
@@ -0,0 +1,86 @@
+import json
+
+from pycpu.mips import coverage
+
+
+# the summary of a run (or a shard of it): the seed, the job id ranges, the counters,
+# the failures of every signature (with the job ids of the saved ones) and the hits of every coverage bin
+def make_summary(seed, jobs, passed, failed, buckets, total_coverage=None):
+    return {
+        'seed': seed,
+        'jobs': [[jobs.start, jobs.stop - 1]] if len(jobs) > 0 else [],
+        'passed': passed,
+        'failed': failed,
+        'signatures': dict(map(lambda x: (x[0], {'failures': x[1][0], 'jobs': x[1][2]}), buckets.items())),
+        'coverage': None if total_coverage is None else {
+            'programs': total_coverage.programs,
+            'hits': total_coverage.hits
+        },
+    }
+
+
+def write_summary(path, summary):
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=4)
+
+
+def load_summary(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# the summary of the shards of a run, the shards have to share the seed and their job ids must not overlap
+def merge_summaries(summaries):
+    if len(summaries) == 0:
+        raise ValueError('no summaries to merge')
+    seeds = set(map(lambda x: x['seed'], summaries))
+    if len(seeds) > 1:
+        raise ValueError(f'the summaries belong to different runs (seeds: {sorted(seeds)})')
+
+    jobs = sorted(sum(map(lambda x: x['jobs'], summaries), []))
+    for (_, last), (first, _) in zip(jobs, jobs[1:]):
+        if first <= last:
+            raise ValueError(f'the shards overlap at job {first}')
+    # adjacent ranges are joined
+    ranges = []
+    for first, last in jobs:
+        if len(ranges) > 0 and ranges[-1][1] + 1 == first:
+            ranges[-1][1] = last
+        else:
+            ranges.append([first, last])
+
+    signatures = {}
+    for summary in summaries:
+        for signature, bucket in summary['signatures'].items():
+            merged = signatures.setdefault(signature, {'failures': 0, 'jobs': []})
+            merged['failures'] += bucket['failures']
+            merged['jobs'] = sorted(merged['jobs'] + bucket['jobs'])
+
+    covered = list(filter(lambda x: x is not None, map(lambda x: x['coverage'], summaries)))
+    return {
+        'seed': seeds.pop(),
+        'jobs': ranges,
+        'passed': sum(map(lambda x: x['passed'], summaries)),
+        'failed': sum(map(lambda x: x['failed'], summaries)),
+        'signatures': signatures,
+        'coverage': None if len(covered) == 0 else {
+            'programs': sum(map(lambda x: x['programs'], covered)),
+            'hits': list(map(sum, zip(*map(lambda x: x['hits'], covered))))
+        },
+    }
+
+
+# the report of a summary in the format of the test bench output
+def format_summary(summary):
+    lines = []
+    for signature, bucket in sorted(summary['signatures'].items(), key=lambda x: -x[1]['failures']):
+        lines.append(f'[SIGNATURE] failures={bucket["failures"]} jobs={",".join(map(str, bucket["jobs"]))} {signature}')
+    ranges = ' '.join(map(lambda x: f'{x[0]}..{x[1]}', summary['jobs']))
+    lines.append(f'[LOG] seed={summary["seed"]} jobs={ranges} total={summary["passed"] + summary["failed"]} '
+                 f'failed={summary["failed"]} passed={summary["passed"]} signatures={len(summary["signatures"])}')
+    if summary['coverage'] is not None:
+        total_coverage = coverage.Coverage()
+        total_coverage.programs = summary['coverage']['programs']
+        total_coverage.hits = summary['coverage']['hits']
+        lines.append(total_coverage.report())
+    return '\n'.join(lines)
@@ -1,19 +1,38 @@
+import itertools
+import multiprocessing
 import os
 import queue
 import threading
 import random
+import time
 
+from pycpu.mips import coverage, fast
 from pycpu.mips.mips import MIPS
+from pycpu.mips.program import CLASSES, Program
 from pycpu.mips.tests.config import Config
-from pycpu.mips.tests.program_generator import ProgramGenerator
+from pycpu.mips.tests.metrics import Metrics, export, format_stats, snapshot
+from pycpu.mips.tests.fuzzer import MutationFuzzer, load_programs
+from pycpu.mips.tests.minimizer import Minimizer, failure_kind
+from pycpu.mips.tests.program_generator import BulkProgramGenerator, CoverageGuidedGenerator, ProgramGenerator
+from pycpu.mips.tests.replay import ReplayGenerator
+from pycpu.mips.tests.store import ResultStore
+from pycpu.mips.tests.summary import make_summary, write_summary
 from pycpu.mips.tests.verilog_api import VerilogApi
 
 
+# the number of mismatches a failure reports
+DIFF_LIMIT = 8
+# the batch engine waits that long for more jobs (after every job) before it emulates a smaller batch
+DRAIN_TIMEOUT = 0.01
+
+
 class TestBench(object):
     class Job(object):
-        def __init__(self, instructions, id):
+        # max_steps - the emulator step limit of the job (None - emulator_max_steps)
+        def __init__(self, instructions, id, max_steps=None):
             self.instructions = instructions
             self._id = id
+            self.max_steps = max_steps
 
         def get_id(self):
             return self._id
@@ -28,147 +47,488 @@ class TestBench(object):
                 ok=True,
                 message=None,
                 source=None,
-                memory_snapshots=(None, None),
+                instructions=None,
+                signature=None,
+                diff=None,
+                coverage=None,
         ):
             self.job_id = job_id
             self.source = source
             self.reason = message
-            self.memory_snapshots = memory_snapshots
             self.ok = ok
+            # only failed results carry their program back (it is needed to save the failure)
+            self.instructions = instructions
+            # the failures with the same signature are most likely caused by the same bug
+            if signature is None and not ok:
+                signature = ': '.join(failure_kind(self))
+            self.signature = signature
+            # the first mismatches: [(register or memory cell, cpu value, verilog value)]
+            self.diff = diff
+            # the coverage bins hit by the program (see coverage.trace), None - not traced
+            self.coverage = coverage
+            # the wall time of the emulator and simulator runs that tested the program (with the other jobs
+            # of a multi-instance run)
+            self.seconds = None
+            # the phase latencies collected by the worker since its previous result (see Metrics.take)
+            self.metrics = None
 
         def is_ok(self):
             return self.ok
 
-    class Tester(threading.Thread):
-        def __init__(self, _input: queue.Queue, _output: queue.Queue, _config: Config, *args, **kwargs):
+    class Worker(object):
+        def __init__(self, _input, _output, _config: Config, _build_file_path, _seed=None, *args, **kwargs):
             self._input = _input
             self._output = _output
-            self._lock = threading.Lock()
-            self._killed = False
-            self._config = _config
+            # not '_config': multiprocessing.Process uses that name
+            self._bench_config = _config
+            self._build_file_path = _build_file_path
+            # workers with a seed (the seed of the run) generate the programs of the jobs themselves
+            self._seed = _seed
+            self._generator = None
+            # the coverage of the programs generated by the worker (the 'coverage' generator of a process worker)
+            self._coverage = None
+            self._cpus = None
+            self._batch = None
+            self._metrics = None
 
             super().__init__(*args, **kwargs)
 
-        def kill(self):
-            self._lock.acquire()
-            self._killed = True
-            self._lock.release()
-
-        def is_killed(self):
-            self._lock.acquire()
-            _killed = self._killed
-            self._lock.release()
-            return _killed
-
         def run(self):
-            cpu = MIPS(
-                mem_size=self._config.memory_cells,
-            )
+            self._metrics = Metrics(self._bench_config.metrics)
+            if self._seed is not None:
+                self._generator = TestBench.create_generator(self._bench_config, self._seed)
+                if isinstance(self._generator, CoverageGuidedGenerator):
+                    self._coverage = coverage.Coverage()
+
+            # one emulator per simulator slot, so a batch can be compared after a single simulator run
+            if self._bench_config.emulator_engine == 'batch':
+                # numpy is imported only for the vectorized engine
+                from pycpu.mips.batch import BatchMIPS
+
+                self._batch = BatchMIPS(mem_size=self._bench_config.memory_cells)
+            else:
+                self._cpus = [
+                    MIPS(mem_size=self._bench_config.memory_cells,
+                         engine=self._bench_config.emulator_engine,
+                         memory=self._bench_config.emulator_memory)
+                    for _ in range(self._bench_config.instances_per_run)
+                ]
 
             verilog = VerilogApi(
-                test_path=self._config.cpu_test_path,
-                build_folder_path=self._config.test_build_folder,
-                iverilog_build_flags=self._config.iverilog_flags,
-                cpu_files_folder=self._config.cpu_folder,
-                max_instructions=self._config.max_instructions,
-                instructions_folder_path=self._config.instructions_folder,
-                registers_array_name=self._config.registers_array_name,
-                memory_array_name=self._config.memory_array_name,
-                instructions_array_name=self._config.instructions_array_name
+                test_path=self._bench_config.cpu_test_path,
+                build_folder_path=self._bench_config.test_build_folder,
+                iverilog_build_flags=self._bench_config.iverilog_flags,
+                cpu_files_folder=self._bench_config.cpu_folder,
+                max_instructions=self._bench_config.max_instructions,
+                instructions_folder_path=self._bench_config.instructions_folder,
+                registers_array_name=self._bench_config.registers_array_name,
+                memory_array_name=self._bench_config.memory_array_name,
+                instructions_array_name=self._bench_config.instructions_array_name,
+                build_file_path=self._build_file_path,
+                server_mode=self._bench_config.simulator_mode == 'server',
+                instances=self._bench_config.instances_per_run,
+                memory_cells=self._bench_config.memory_cells,
+                dump_format=self._bench_config.dump_format,
+                metrics=self._metrics
             )
 
-            while True:
-                if self.is_killed():
-                    return
-                try:
-                    job = self._input.get(timeout=3, block=True)
-                except Exception:
-                    continue
+            try:
+                self._loop(verilog)
+            finally:
+                verilog.close()
+
+        def _loop(self, verilog):
+            # None is the end-of-work marker, one per worker
+            finished = False
+            size = TestBench.drain_size(self._bench_config)
+            batch = self._batch is not None
+            # the jobs taken from the queue and not run yet (a queue item is a job or a list of jobs, see _produce)
+            pending = []
+            while pending or not finished:
+                if not pending:
+                    started = time.perf_counter()
+                    job = self._input.get()
+                    self._metrics.add('wait', time.perf_counter() - started)
+                    self._input.task_done()
+                    if job is None:
+                        return
+                    pending = job if isinstance(job, list) else [job]
+                jobs, pending = pending[:size], pending[size:]
+                while not pending and len(jobs) < size:
+                    try:
+                        job = self._input.get(block=batch, timeout=DRAIN_TIMEOUT if batch else None)
+                    except queue.Empty:
+                        break
+                    self._input.task_done()
+                    if job is None:
+                        finished = True
+                        break
+                    job = job if isinstance(job, list) else [job]
+                    room = size - len(jobs)
+                    jobs, pending = jobs + job[:room], job[room:]
+
+                started = time.perf_counter()
+                for job in jobs:
+                    if job.get_instructions() is None:
+                        job.instructions = self._generator.generate_job(self._seed, job.get_id())
+                if self._seed is not None:
+                    self._metrics.add('generate', time.perf_counter() - started)
+                instructions = dict(map(lambda job: (job.get_id(), job.get_instructions()), jobs))
+
+                started = time.perf_counter()
+                results = self._test_jobs(verilog, jobs)
+                seconds = time.perf_counter() - started
+                self._metrics.add('job', seconds)
+                # the collected metrics travel with the last result of the batch
+                if len(results) > 0:
+                    results[-1].metrics = self._metrics.take()
+                for res in results:
+                    if not res.is_ok():
+                        res.instructions = instructions[res.job_id]
+                    if TestBench.traces_coverage(self._bench_config):
+                        res.coverage = self._trace(instructions[res.job_id])
+                    # the corpus keeps the programs with new coverage or new failures
+                    if isinstance(self._generator, MutationFuzzer):
+                        self._generator.observe(instructions[res.job_id], res)
+                    self._output.put(res)
 
+        def _trace(self, instructions):
+            started = time.perf_counter()
+            mask = coverage.trace(fast.predecode(instructions),
+                                  reg_cnt=32,
+                                  mem_size=self._bench_config.memory_cells,
+                                  max_steps=self._bench_config.emulator_max_steps)
+            self._metrics.add('trace', time.perf_counter() - started)
+            if self._coverage is not None:
+                self._coverage.add(mask)
+                if self._coverage.programs % self._bench_config.coverage_update_interval == 0:
+                    self._generator.update(self._coverage)
+            return mask
+
+        def _max_steps(self, job):
+            return self._bench_config.emulator_max_steps if job.max_steps is None else job.max_steps
+
+        # the jobs with the same step limit run in one batch
+        def _emulate_batch(self, jobs, results):
+            emulated = []
+            for max_steps, group in itertools.groupby(jobs, self._max_steps):
+                group = list(group)
+                self._batch.run(list(map(lambda x: x.get_instructions(), group)), max_steps=max_steps)
+                for i, job in enumerate(group):
+                    if i in self._batch.errors:
+                        results.append(
+                            TestBench.Result(job.get_id(), ok=False,
+                                             message=f'unexpected error: {self._batch.errors[i]}', source='cpu')
+                        )
+                        continue
+                    emulated.append((self._batch.lane(i), job))
+            return emulated
+
+        def _emulate(self, jobs, results):
+            if self._batch is not None:
+                return self._emulate_batch(jobs, results)
+
+            emulated = []
+            for cpu, job in zip(self._cpus, jobs):
                 try:
                     cpu.reset()
                     cpu.set_instructions(job.get_instructions())
-                    cpu.run(time_out=self._config.time_out)
+                    cpu.run(time_out=self._bench_config.time_out, max_steps=self._max_steps(job))
                 except Exception as ex:
-                    res = TestBench.Result(job.get_id(), ok=False, message=f'unexpected error: {ex}', source='cpu')
-                    self._output.put(res, block=False)
-                    self._input.task_done()
+                    results.append(
+                        TestBench.Result(job.get_id(), ok=False, message=f'unexpected error: {ex}', source='cpu')
+                    )
                     continue
+                emulated.append((cpu, job))
+            return emulated
+
+        # the jobs are emulated at once and simulated instances_per_run at a time, the seconds of a result are
+        # its share of the emulation and the time of its simulator run
+        def _test_jobs(self, verilog, jobs):
+            results = []
+            started = time.perf_counter()
+            emulated = self._emulate(jobs, results)
+            emulation = (time.perf_counter() - started) / len(jobs)
+            self._metrics.add('emulate', time.perf_counter() - started)
+            for res in results:
+                res.seconds = emulation
+
+            size = self._bench_config.instances_per_run
+            for i in range(0, len(emulated), size):
+                started = time.perf_counter()
+                simulated = self._simulate(verilog, emulated[i:i + size])
+                for res in simulated:
+                    res.seconds = emulation + time.perf_counter() - started
+                results.extend(simulated)
+            return results
+
+        def _simulate(self, verilog, emulated):
+            results = []
+            # a correct cpu executes exactly as many instructions as the emulator did
+            max_cycles = list(map(lambda x: self._max_cycles(x[0]), emulated))
+            try:
+                if self._bench_config.instances_per_run > 1:
+                    dumps = verilog.run_many(list(map(lambda x: x[1].get_instructions(), emulated)),
+                                             time_out=self._bench_config.time_out,
+                                             max_cycles=max_cycles)
+                else:
+                    dumps = [verilog.run(emulated[0][1].get_instructions(),
+                                         time_out=self._bench_config.time_out,
+                                         max_cycles=max_cycles[0])]
+            except Exception as ex:
+                for _, job in emulated:
+                    results.append(
+                        TestBench.Result(job.get_id(), ok=False, message=f'unexpected error: {ex}', source='verilog')
+                    )
+                return results
 
-                try:
-                    verilog_registers, verilog_memory = verilog.run(job.get_instructions(),
-                                                                    time_out=self._config.time_out)
-                except Exception as ex:
-                    res = TestBench.Result(job.get_id(), ok=False, message=f'unexpected error: {ex}', source='verilog')
-                    self._output.put(res, block=False)
-                    self._input.task_done()
+            started = time.perf_counter()
+            for (cpu, job), dump in zip(emulated, dumps):
+                if dump is None:
+                    results.append(
+                        TestBench.Result(job.get_id(), ok=False, message='no dump from the simulator', source='verilog')
+                    )
                     continue
-
-                mem_failed = False
-                for i in range(self._config.memory_cells):
-                    cpu_cell = cpu.read_mem(i)
-                    verilog_cell = verilog_memory[i]
-                    if cpu_cell != verilog_cell:
-                        mem_failed = True
-                        break
-
-                if mem_failed:
-                    res = TestBench.Result(job.get_id(),
-                                           ok=False,
-                                           message='memory check failed',
-                                           source='cpu+verilog',
-                                           memory_snapshots=(cpu.memory.copy(), verilog_memory.copy())
-                                           )
-                    self._output.put(res)
-                    self._input.task_done()
+                if isinstance(dump, Exception):
+                    results.append(
+                        TestBench.Result(job.get_id(), ok=False, message=f'unexpected error: {dump}', source='verilog')
+                    )
                     continue
-
-                reg_failed = False
-                for i in range(self._config.registers_range[0], self._config.registers_range[1] + 1):
-                    cpu_cell = cpu.read_reg(i)
-                    verilog_cell = verilog_registers[i]
-                    if cpu_cell != verilog_cell:
-                        reg_failed = True
-                        break
-
-                if reg_failed:
-                    res = TestBench.Result(job.get_id(),
-                                           ok=False,
-                                           message='registers check failed',
-                                           source='cpu+verilog',
-                                           memory_snapshots=(cpu.registers.copy(), verilog_registers.copy())
+                results.append(self._compare(cpu, job, *dump))
+            self._metrics.add('compare', time.perf_counter() - started)
+            return results
+
+        def _max_cycles(self, cpu):
+            if self._bench_config.cycle_slack is None:
+                return None
+            return int(cpu.steps * self._bench_config.cycle_slack) + self._bench_config.cycle_margin
+
+        def _compare(self, cpu, job, verilog_registers, verilog_memory):
+            # the dumps are compared with the written non-zero cells of the emulator, a dense dump
+            # (an int32 array of every cell) is reduced to its non-zero cells first
+            if not isinstance(verilog_memory, dict):
+                values = verilog_memory[:self._bench_config.memory_cells].tolist()
+                verilog_memory = dict((x, values[x]) for x in itertools.compress(range(len(values)), values))
+            cpu_memory = cpu.memory_snapshot()
+            cells = sorted(set(cpu_memory) | set(verilog_memory))
+            bad = list(filter(lambda x: cpu_memory.get(x, 0) != verilog_memory.get(x, 0), cells))
+            mem_diff = list(map(lambda x: (x, cpu_memory.get(x, 0), verilog_memory.get(x, 0)), bad[:DIFF_LIMIT]))
+
+            if len(mem_diff) > 0:
+                return self._failure(job, 'memory check failed', mem_diff, 'mem[{}]', memory=True)
+
+            registers = range(self._bench_config.registers_range[0], self._bench_config.registers_range[1] + 1)
+            bad = list(filter(lambda x: cpu.read_reg(x) != verilog_registers[x], registers))
+            reg_diff = list(map(lambda x: (x, cpu.read_reg(x), int(verilog_registers[x])), bad[:DIFF_LIMIT]))
+
+            if len(reg_diff) > 0:
+                return self._failure(job, 'registers check failed', reg_diff, '${}', memory=False)
+
+            return TestBench.Result(job.get_id())
+
+        # signature: the message, the first divergent register/memory cell and the opcode that last wrote it
+        # in the emulator (the program is traced again, only for the failures)
+        def _failure(self, job, message, diff, name, memory):
+            first = diff[0][0]
+            reg_writers, mem_writers = fast.last_writers(fast.predecode(job.get_instructions()),
+                                                         reg_cnt=32,
+                                                         mem_size=self._bench_config.memory_cells,
+                                                         max_steps=self._max_steps(job))
+            op = (mem_writers if memory else reg_writers).get(first)
+            writer = 'none' if op is None else CLASSES[op].__name__.lower()
+            return TestBench.Result(job.get_id(),
+                                    ok=False,
+                                    message=message,
+                                    source='cpu+verilog',
+                                    signature=f'{message}: {name.format(first)} <- {writer}',
+                                    diff=list(map(lambda x: (name.format(x[0]), x[1], x[2]), diff))
+                                    )
+
+    class Tester(Worker, threading.Thread):
+        # _generator - the generator of the producer, the worker only reports the results to a MutationFuzzer
+        def __init__(self, _input: queue.Queue, _output: queue.Queue, _config: Config, _build_file_path,
+                     _generator=None, *args, **kwargs):
+            super().__init__(_input, _output, _config, _build_file_path, None, *args, **kwargs)
+            self._generator = _generator
+
+    # runs in its own process (worker_mode='process'), so the emulator, the program generator
+    # and the output decoding are not limited by the GIL; only job ids and compact results cross the process boundary
+    class ProcessTester(Worker, multiprocessing.Process):
+        def __init__(self, _input, _output, _config: Config, _build_file_path, _seed, *args, **kwargs):
+            super().__init__(_input, _output, _config, _build_file_path, _seed, *args, **kwargs)
+
+    @staticmethod
+    def create_generator(config: Config, seed=None):
+        if config.replay_folders is not None:
+            return ReplayGenerator(config.replay_folders, max_length=config.max_instructions - 1)
+        if config.program_generator == 'bulk':
+            return BulkProgramGenerator(memory_cells=config.memory_cells,
+                                        amount=config.max_instructions - 1,
+                                        reg_range=config.registers_range,
+                                        mem_op_ratio=config.mem_op_ratio,
+                                        loop_probability=config.loop_probability,
+                                        seed=seed,
+                                        batch_size=config.generator_batch_size
+                                        )
+        if config.program_generator == 'corpus':
+            return MutationFuzzer(memory_cells=config.memory_cells,
+                                  amount=config.max_instructions - 1,
+                                  reg_range=config.registers_range,
+                                  seeds=load_programs([config.corpus_folder, config.fails_folder])
+                                  )
+        if config.program_generator == 'coverage':
+            return CoverageGuidedGenerator(memory_cells=config.memory_cells,
+                                           amount=config.max_instructions - 1,
+                                           reg_range=config.registers_range,
+                                           mem_op_ratio=config.mem_op_ratio,
+                                           loop_probability=config.loop_probability
                                            )
-                    self._output.put(res)
-                    self._input.task_done()
-                    continue
-
-                res = TestBench.Result(job.get_id())
-                self._output.put(res)
-                self._input.task_done()
-
-    def __init__(self, config=None):
+        return ProgramGenerator(memory_cells=config.memory_cells,
+                                amount=config.max_instructions - 1,
+                                reg_range=config.registers_range,
+                                mem_op_ratio=config.mem_op_ratio,
+                                loop_probability=config.loop_probability
+                                )
+
+    @staticmethod
+    def traces_coverage(config: Config):
+        return config.coverage or config.program_generator in ('coverage', 'corpus')
+
+    # whether the program of a job is a function of the seed and the job id alone
+    # (the 'coverage' and 'corpus' generators adapt to the results seen so far in the run)
+    @staticmethod
+    def regenerates_jobs(config: Config):
+        return config.replay_folders is not None or config.program_generator not in ('coverage', 'corpus')
+
+    # the number of jobs a worker takes from the input queue at once (the batch engine emulates them together)
+    @staticmethod
+    def drain_size(config: Config):
+        return config.emulator_batch_size if config.emulator_engine == 'batch' else config.instances_per_run
+
+    # jobs - the ids of the tests to run (all of them by default, see shard), summary_path - the json file
+    # the summary of the run is written to (see summary.py), resume - skip the jobs already in the result store,
+    # replay - the ReplayGenerator of config.replay_folders (loaded here if not given), a test per replayed program
+    def __init__(self, config=None, jobs=None, summary_path=None, resume=False, replay=None):
         if config is None:
             config = Config.from_file('')
 
         self._config = config
-
-    def _save_failed_program(self, instructions):
+        self._replay = replay
+        if self._replay is None and config.replay_folders is not None:
+            self._replay = TestBench.create_generator(config)
+        if self._replay is not None:
+            config.tests = len(self._replay)
+        self._jobs = range(1, config.tests + 1) if jobs is None else jobs
+        self._summary_path = summary_path
+        self._resume = resume
+        self._seed = None
+        self._next_job_id = 0
+
+    # the ids of the i-th of n disjoint slices of the tests (i from 0)
+    @staticmethod
+    def shard(tests, i, n):
+        return range(i * tests // n + 1, (i + 1) * tests // n + 1)
+
+    # tag - '{seed}_{job id}', suffix - '_min' for the minimized reproducer of the failure with the same tag
+    def _save_failed_program(self, instructions, tag, suffix=''):
         if not os.path.isdir(self._config.fails_folder):
             os.mkdir(self._config.fails_folder)
 
-        _bin = '\n'.join(map(lambda i: i.binary(), instructions))
-        _asm = '\n'.join(map(lambda i: i.asm(), instructions))
-
-        tag = random.randint(0, 10000000)
+        program = Program.from_instructions(instructions)
+        _bin = program.readmemb(breakpoint=False)
+        _asm = '\n'.join(map(lambda i: i.asm(), program.instructions()))
 
         # dumping binaries
-        with open(os.path.join(self._config.fails_folder, f'{tag}_bin'), 'w') as f:
+        with open(os.path.join(self._config.fails_folder, f'{tag}{suffix}_bin'), 'w') as f:
             f.write(_bin)
         # dumping asm
-        with open(os.path.join(self._config.fails_folder, f'{tag}_asm'), 'w') as f:
+        with open(os.path.join(self._config.fails_folder, f'{tag}{suffix}_asm'), 'w') as f:
             f.write(_asm)
         return tag
 
+    @staticmethod
+    def _receive(_output, workers):
+        while True:
+            try:
+                return _output.get(timeout=1)
+            except queue.Empty:
+                if not any(map(lambda x: x.is_alive(), workers)):
+                    raise RuntimeError('all the workers have stopped')
+
+    # runs the programs on the workers and returns their results (in the order of the programs)
+    def _evaluate(self, _input, _output, workers, programs):
+        indices = {}
+        for i, program in enumerate(programs):
+            self._next_job_id += 1
+            indices[self._next_job_id] = i
+            _input.put(TestBench.Job(program, self._next_job_id, max_steps=self._config.minimize_max_steps))
+        results = [None] * len(programs)
+        while len(indices) > 0:
+            res = TestBench._receive(_output, workers)
+            if res.job_id in indices:
+                results[indices.pop(res.job_id)] = res
+        return results
+
+    @staticmethod
+    def _queue_depth(q):
+        try:
+            return q.qsize()
+        except NotImplementedError:
+            # multiprocessing queues on macos
+            return None
+
+    def _stats(self, metrics, _input, _output, passed, failed, total, buckets, started, resumed):
+        elapsed = time.monotonic() - started
+        rate = (passed + failed - resumed) / elapsed if elapsed > 0 else 0.0
+        counters = {
+            'total': total,
+            'passed': passed,
+            'failed': failed,
+            'signatures': len(buckets),
+            'rate': rate,
+            'eta': (total - passed - failed) / rate if rate > 0 else None,
+        }
+        queues = {'input': TestBench._queue_depth(_input), 'output': TestBench._queue_depth(_output)}
+        data = snapshot(metrics, counters, queues)
+        print(format_stats(data))
+        if self._config.metrics_file is not None:
+            export(self._config.metrics_file, data)
+
+    def _report_failure(self, res, bucket, failures, failed, passed):
+        try:
+            tag = self._save_failed_program(res.instructions, tag=f'{self._seed}_{res.job_id}')
+        except Exception as ex:
+            print('failed to save a file:', ex)
+            tag = '<UNKNOWN>'
+        else:
+            if bucket[1] == 0 and len(failures) < self._config.minimize_failures:
+                failures.append((tag, res))
+        bucket[1] += 1
+        bucket[2].append(res.job_id)
+
+        diff = ''
+        if res.diff is not None:
+            diff = '\n' + '\n'.join(map(lambda x: f'  {x[0]}: cpu={x[1]} verilog={x[2]}', res.diff))
+        print(
+            f'[FAILURE] source=\'{res.source}\' message=\'{res.reason}\'\n'
+            f'signature={res.signature}{diff}\n'
+            f'tag={tag}\n'
+            f'failed={failed} passed={passed}'
+        )
+
+    def _minimize(self, _input, _output, workers, failures):
+        minimizer = Minimizer(lambda programs: self._evaluate(_input, _output, workers, programs),
+                              max_tests=self._config.minimize_max_tests)
+        for tag, res in failures:
+            program = Program.from_instructions(res.instructions)
+            try:
+                minimized = minimizer.minimize(program, res)
+                self._save_failed_program(minimized, tag=tag, suffix='_min')
+            except Exception as ex:
+                print(f'[ERROR] failed to minimize {tag}:', ex)
+                continue
+            print(f'[MINIMIZED] tag={tag} instructions={len(program)}->{len(minimized)} tests={minimizer.tests}')
+
     def run(self):
         if self._config.instructions_array_name is None or \
                 self._config.memory_array_name is None or \
@@ -177,7 +537,8 @@ class TestBench(object):
                 self._config.cpu_folder,
                 self._config.registers_array_name,
                 self._config.memory_array_name,
-                self._config.instructions_array_name
+                self._config.instructions_array_name,
+                cache_folder=self._config.test_build_folder
             )
 
             if self._config.registers_array_name is None:
@@ -187,65 +548,185 @@ class TestBench(object):
             if self._config.instructions_array_name is None:
                 self._config.instructions_array_name = instructions_array_name
 
-        generator = ProgramGenerator(memory_cells=self._config.memory_cells,
-                                     amount=self._config.max_instructions - 1,
-                                     reg_range=self._config.registers_range
-                                     )
-
-        _input = queue.Queue()
-        _output = queue.Queue()
+        # the test bench is compiled once and the binary is shared by all the workers
+        multi_instance = self._config.instances_per_run > 1
+        build_file_path = VerilogApi.compile_tests(
+            test_path=self._config.multi_cpu_test_path if multi_instance else self._config.cpu_test_path,
+            build_folder_path=self._config.test_build_folder,
+            iverilog_build_flags=self._config.iverilog_flags,
+            cpu_files_folder=self._config.cpu_folder,
+            instructions_array_name=self._config.instructions_array_name,
+            registers_array_name=self._config.registers_array_name,
+            memory_array_name=self._config.memory_array_name,
+            instances=self._config.instances_per_run if multi_instance else None
+        )
+
+        store = None
+        if self._config.result_store is not None:
+            store = ResultStore(self._config.result_store, batch_size=self._config.store_batch_size)
+
+        # the programs are a function of the seed and the job ids, the shards of a run share the seed
+        # (a resumed run continues with the seed of the store)
+        self._seed = self._config.seed
+        if self._seed is None and self._resume:
+            self._seed = store.seed()
+        if self._seed is None:
+            self._seed = random.getrandbits(32)
+        if store is not None:
+            store.open_run(self._seed)
+
+        if self._replay is not None:
+            for path, reason in self._replay.skipped:
+                print(f'[ERROR] can\'t replay {path}: {reason}')
+            print(f'[LOG] replaying {len(self._replay)} programs of {", ".join(self._config.replay_folders)}')
+
+        process_mode = self._config.worker_mode == 'process'
+        generator = None
+        if not process_mode:
+            generator = self._replay if self._replay is not None else TestBench.create_generator(self._config)
+
+        # the process workers get the jobs of the bulk generator by whole batches, so every batch is generated
+        # once, by the worker that runs it
+        batch_size = None
+        if process_mode and self._replay is None and self._config.program_generator == 'bulk':
+            batch_size = self._config.generator_batch_size
+
+        # the input queue is bounded, so the producer never runs far ahead of the workers
+        max_queued = 2 * self._config.workers * (1 if batch_size is not None else TestBench.drain_size(self._config))
+        if process_mode:
+            _input = multiprocessing.JoinableQueue(maxsize=max_queued)
+            _output = multiprocessing.Queue()
+        else:
+            _input = queue.Queue(maxsize=max_queued)
+            _output = queue.Queue()
 
         workers = []
         for i in range(self._config.workers):
-            w = TestBench.Tester(_input, _output, self._config)
+            if process_mode:
+                w = TestBench.ProcessTester(_input, _output, self._config, build_file_path, self._seed)
+            else:
+                w = TestBench.Tester(_input, _output, self._config, build_file_path, generator)
+            # an aborted run must not wait for the workers
+            w.daemon = True
             workers.append(w)
             w.start()
-        print(f'[LOG] starting (workers={self._config.workers})')
-        tasks_to_do = self._config.tests
-        tasks_enqueued = 0
-
-        jobs = {}
+        jobs = self._jobs
+        print(f'[LOG] starting (workers={self._config.workers}, mode={self._config.worker_mode}, seed={self._seed}, '
+              f'jobs={jobs.start}..{jobs.stop - 1})')
 
         passed = 0
         failed = 0
-        total = self._config.tests
-
-        job_id = 0
-
-        while tasks_to_do > 0:
-            while not _output.empty():
-                if (failed + passed) % 100 == 99:
-                    print(f'[LOG] total={total} failed={failed} passed={passed}')
-
-                res: TestBench.Result = _output.get(block=False)
-                instructions = jobs[res.job_id]
-                del jobs[res.job_id]
+        # signature -> [failures, saved reproducers, their job ids]
+        buckets = {}
+        # the jobs to run (the ids from first, except the ones in done)
+        first, done = jobs.start, set()
+        if self._resume:
+            first, done = store.pending(jobs)
+            passed, failed, signatures = store.counts(jobs, self._config.failures_per_signature)
+            for signature, (count, saved_jobs) in signatures.items():
+                buckets[signature] = [count, len(saved_jobs), saved_jobs]
+            print(f'[LOG] resuming from job {first} (passed={passed} failed={failed})')
+        pending = range(first, jobs.stop)
+
+        total = passed + failed + len(pending) - len(done)
+        last_new_signature = passed + failed
+        # the jobs of the minimization get the ids after the tests
+        self._next_job_id = max(self._config.tests, jobs.stop - 1)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=TestBench._produce,
+            args=(_input, generator, filter(lambda x: x not in done, pending), self._seed, stop, batch_size),
+            daemon=True
+        )
+        producer.start()
+        # the first failure of every signature is minimized (up to minimize_failures of them)
+        # by the workers once all the tests are done
+        failures = []
+        # the coverage of all the programs; in the thread mode it also steers the generator of the producer
+        total_coverage = coverage.Coverage() if TestBench.traces_coverage(self._config) else None
+        # the phase latencies of all the workers, a summary is printed (and exported) every stats_interval seconds
+        metrics = Metrics(self._config.metrics)
+        resumed = passed + failed
+        started = time.monotonic()
+        next_stats = started + self._config.stats_interval
+
+        try:
+            while failed + passed < total:
+                res: TestBench.Result = TestBench._receive(_output, workers)
+                if store is not None:
+                    store.add(self._seed, res)
+                if res.metrics is not None:
+                    metrics.merge(res.metrics)
+
+                if total_coverage is not None and res.coverage is not None:
+                    total_coverage.add(res.coverage)
+                    if isinstance(generator, CoverageGuidedGenerator) and \
+                            total_coverage.programs % self._config.coverage_update_interval == 0:
+                        generator.update(total_coverage)
+
+                if time.monotonic() >= next_stats:
+                    self._stats(metrics, _input, _output, passed, failed, total, buckets, started, resumed)
+                    next_stats = time.monotonic() + self._config.stats_interval
 
                 if res.is_ok():
                     passed += 1
                 else:
-                    try:
-                        tag = self._save_failed_program(instructions)
-                    except Exception as ex:
-                        print('failed to save a file:', ex)
-                        tag = '<UNKNOWN>'
-
-                    print(
-                        f'[FAILURE] source=\'{res.source}\' message=\'{res.reason}\'\n'
-                        f'cpu_memory={res.memory_snapshots[0]}\n'
-                        f'verilog_memory={res.memory_snapshots[1]}\n'
-                        f'tag={tag}\n'
-                        f'failed={failed} passed={passed}'
-                        f''
-                    )
-
                     failed += 1
-                tasks_to_do -= 1
-            if tasks_enqueued < total:
-                instructions = generator.generate()
-                job_id += 1
-                jobs[job_id] = instructions
-                _input.put(TestBench.Job(instructions, job_id))
-
+                    if res.signature not in buckets:
+                        buckets[res.signature] = [0, 0, []]
+                        last_new_signature = failed + passed
+                    bucket = buckets[res.signature]
+                    bucket[0] += 1
+                    # every replayed program that differs is listed
+                    if self._replay is not None:
+                        print(f'[REPLAY] job={res.job_id} {self._replay.path(res.job_id)}: {res.signature}')
+                    # only the first failures_per_signature failures of a signature are saved and printed
+                    if bucket[1] < self._config.failures_per_signature:
+                        self._report_failure(res, bucket, failures, failed, passed)
+
+                saturation = self._config.stop_on_saturation
+                if saturation is not None and len(buckets) > 0 and \
+                        failed + passed - last_new_signature >= saturation and \
+                        all(map(lambda x: x[1] >= self._config.failures_per_signature, buckets.values())):
+                    print(f'[LOG] every signature is saturated, stopping after {failed + passed} tests')
+                    stop.set()
+                    break
+        finally:
+            # the results received before an interruption stay in the store
+            if store is not None:
+                store.close()
+
+        for signature, (count, saved, _) in sorted(buckets.items(), key=lambda x: -x[1][0]):
+            print(f'[SIGNATURE] failures={count} saved={saved} {signature}')
+        self._stats(metrics, _input, _output, passed, failed, total, buckets, started, resumed)
+        if total_coverage is not None:
+            print(total_coverage.report())
+        if isinstance(generator, MutationFuzzer):
+            print(f'[LOG] corpus={len(generator)}')
+        if self._summary_path is not None:
+            write_summary(self._summary_path, make_summary(self._seed, jobs, passed, failed, buckets, total_coverage))
+
+        producer.join()
+        self._minimize(_input, _output, workers, failures)
+
+        for _ in workers:
+            _input.put(None)
         for w in workers:
-            w.kill()
+            w.join()
+
+    # batch_size - the jobs are put as lists of the jobs of a batch of batch_size consecutive ids
+    # (see BulkProgramGenerator.generate_job), one job at a time by default
+    @staticmethod
+    def _produce(_input, generator, jobs, seed, stop, batch_size=None):
+        if batch_size is not None:
+            for _, ids in itertools.groupby(jobs, lambda x: (x - 1) // batch_size):
+                if stop.is_set():
+                    return
+                _input.put(list(map(lambda x: TestBench.Job(None, x), ids)))
+            return
+        for job_id in jobs:
+            if stop.is_set():
+                return
+            # in the process mode the workers generate the programs themselves
+            instructions = None if generator is None else generator.generate_job(seed, job_id)
+            _input.put(TestBench.Job(instructions, job_id))
@@ -1,36 +1,194 @@
+import hashlib
+import json
 import os
-import random
-import subprocess
+import queue
+import re
+import shlex
 import shutil
-from pycpu.instruction import Instruction
-from pycpu.mips.util import twos_comp
-
-from pyverilog.vparser.parser import VerilogCodeParser
-from pyverilog.vparser import ast as vast
-
-
-def _expand_array(arr, size):
-    if len(arr) >= size:
-        return arr
-    arr.extend([0] * (size - len(arr)))
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+
+from pycpu.mips.program import Program
+from pycpu.mips.tests.metrics import Metrics
+
+
+# the simulated cpu ran more cycles than allowed (the test bench printed TIMEOUT)
+class CycleLimitExceeded(TimeoutError):
+    pass
+
+
+# the int32 values of big-endian 32-bit words
+def _int32_words(data):
+    values = array('i', data)
+    if sys.byteorder == 'little':
+        values.byteswap()
+    return values
+
+
+# '<index> <32 binary digits>' lines (the default dump of the test benches), decoded with numpy
+def _decode_binary_dump(lines, size):
+    import numpy as np
+
+    if len(lines) == 0:
+        return np.zeros(size, dtype=np.int32)
+    tokens = b' '.join(lines).split()
+    digits = tokens[1::2]
+    if len(tokens) != 2 * len(lines) or any(map(lambda x: len(x) != 32, digits)):
+        raise ValueError(f'malformed dump: {lines[0]!r}...')
+    bits = np.frombuffer(b''.join(digits), dtype=np.uint8).reshape(-1, 32) - ord('0')
+    if bits.max() > 1:
+        raise ValueError(f'malformed dump (undefined bits?): {lines[0]!r}...')
+    indices = np.array(tokens[0::2]).astype(np.int64)
+    weights = (1 << np.arange(31, -1, -1, dtype=np.uint64)).astype(np.uint64)
+    values = (bits.astype(np.uint64) @ weights).astype(np.uint32).view(np.int32)
+
+    words = np.zeros(max(size, int(indices.max()) + 1), dtype=np.int32)
+    words[indices] = values
+    return words
+
+
+# '<tag> <8 hex digits> <8 hex digits> ...' - the whole array in one line (+hex_dump)
+def _decode_hex_dump(line, size):
+    values = _int32_words(bytes.fromhex(line.partition(b' ')[2].replace(b' ', b'').decode('ascii')))
+    if len(values) < size:
+        values.frombytes(bytes(values.itemsize * (size - len(values))))
+    return values
+
+
+# 'MEMORY_SPARSE <cell> <8 hex digits> ...' - only the written non-zero cells (+sparse_dump), decoded into {cell: value}
+def _decode_sparse_dump(line):
+    tokens = line.split()[1:]
+    if len(tokens) == 0:
+        return {}
+    values = _int32_words(bytes.fromhex(b''.join(tokens[1::2]).decode('ascii'))).tolist()
+    return dict(zip(map(int, tokens[0::2]), values))
+
+
+# decodes the output of a test bench while it is being read, line by line (bytes), into int32 arrays;
+# instances=None - a single cpu (the dump ends with FINISH), otherwise the INSTANCE k ... INSTANCE_END blocks
+# of a multi-instance run. dumps - a (registers, memory) per program, None if the program
+# did not reach its breakpoint, a CycleLimitExceeded if it ran out of cycles
+# (the memory is a {cell: value} dict of the non-zero cells for the sparse dumps)
+class DumpDecoder(object):
+    _SECTIONS = {
+        b'MEMORY_DUMP_BEGIN': (b'MEMORY_DUMP_END', 'memory'),
+        b'REG_DUMP_BEGIN': (b'REG_DUMP_END', 'registers'),
+    }
+
+    def __init__(self, memory_size=0, registers_size=32, instances=None):
+        self._memory_size = memory_size
+        self._registers_size = registers_size
+        self._instances = instances
+        self.dumps = [None] * (1 if instances is None else instances)
+        self.finished = False
+        self._slot = 0 if instances is None else None
+        self._section = None
+        self._section_lines = []
+        self._arrays = {}
+        self._timed_out = False
+
+    def _begin(self, slot):
+        self._slot = slot
+        self._arrays = {}
+        self._timed_out = False
+
+    def _end(self):
+        if self._slot is not None and self._slot < len(self.dumps):
+            if self._timed_out:
+                self.dumps[self._slot] = CycleLimitExceeded('verilog cpu cycle limit exceeded')
+            elif 'memory' in self._arrays and 'registers' in self._arrays:
+                self.dumps[self._slot] = (self._arrays['registers'], self._arrays['memory'])
+        self._slot = None
+
+    def _size(self, name):
+        return self._memory_size if name == 'memory' else self._registers_size
+
+    # returns True once the whole run is decoded (FINISH)
+    def feed(self, line):
+        line = line.strip()
+        if self._section is not None:
+            end, name = self._section
+            if line == end:
+                self._arrays[name] = _decode_binary_dump(self._section_lines, self._size(name))
+                self._section, self._section_lines = None, []
+            else:
+                self._section_lines.append(line)
+        elif line in DumpDecoder._SECTIONS:
+            self._section = DumpDecoder._SECTIONS[line]
+        elif line.startswith(b'MEMORY_SPARSE'):
+            self._arrays['memory'] = _decode_sparse_dump(line)
+        elif line.startswith(b'MEMORY_HEX'):
+            self._arrays['memory'] = _decode_hex_dump(line, self._memory_size)
+        elif line.startswith(b'REG_HEX'):
+            self._arrays['registers'] = _decode_hex_dump(line, self._registers_size)
+        elif line == b'TIMEOUT':
+            self._timed_out = True
+        elif line.startswith(b'INSTANCE '):
+            self._begin(int(line.split(b' ')[1]))
+        elif line == b'INSTANCE_END':
+            self._end()
+        elif line == b'FINISH':
+            if self._instances is None:
+                self._end()
+            self.finished = True
+        return self.finished
+
+    # the dump of a single-cpu run
+    def result(self):
+        dump = self.dumps[0]
+        if dump is None:
+            raise RuntimeError('the program did not reach its breakpoint')
+        if isinstance(dump, Exception):
+            raise dump
+        return dump
+
+
+# the arrays (the declarations with an unpacked dimension) of every module of a verilog source, found with
+# regular expressions, or None if the declarations can't be read without a full parse (the preprocessor is used,
+# an unusual declaration)
+def _scan_arrays(text):
+    text = re.sub(r'/\*.*?\*/', ' ', text, flags=re.S)
+    text = re.sub(r'//[^\n]*', ' ', text)
+    if '`' in text:
+        return None
+    modules = {}
+    for name, body in re.findall(r'\bmodule\s+(\w+)(.*?)\bendmodule\b', text, flags=re.S):
+        arrays = []
+        for declaration in re.findall(r'\b(?:reg|wire|logic|integer)\b([^;]*);', body):
+            # the signedness and the packed dimensions precede the names
+            declaration = re.sub(r'^\s*(?:(?:signed|unsigned)\b)?\s*(?:\[[^\]]*\]\s*)*', '', declaration)
+            for item in declaration.split(','):
+                match = re.match(r'\s*(\w+)\s*((?:\[[^\]]*\]\s*)*)(?:=.*)?$', item, flags=re.S)
+                if match is None:
+                    return None
+                if match.group(2).strip():
+                    arrays.append(match.group(1))
+        modules[name] = arrays
+    return modules
 
 
 class VerilogApi(object):
+    # the declarations of the modules of a verilog file, parsed with pyverilog (imported only when a file is parsed)
     class ModuleParser(object):
         def __init__(self, filename):
             self._file = filename
 
-        def _parse_dimensions(self, dims: vast.Dimensions):
+        def _parse_dimensions(self, dims: 'vast.Dimensions'):
             if dims is None:
                 return None
             return list(map(self._parse_width, dims.lengths))
 
-        def _parse_width(self, w: vast.Width):
+        def _parse_width(self, w: 'vast.Width'):
             if w is None:
                 return None
             return w.msb, w.lsb
 
-        def _parse_variable(self, node: vast.Variable):
+        def _parse_variable(self, node: 'vast.Variable'):
             return {
                 'name': node.name,
                 'value': node.value,
@@ -39,7 +197,9 @@ class VerilogApi(object):
                 'signed': node.signed
             }
 
-        def _parse_declaration(self, node: vast.Decl):
+        def _parse_declaration(self, node: 'vast.Decl'):
+            from pyverilog.vparser import ast as vast
+
             variables = []
 
             for item in node.list:
@@ -48,7 +208,9 @@ class VerilogApi(object):
 
             return variables
 
-        def _parse_module(self, node: vast.ModuleDef):
+        def _parse_module(self, node: 'vast.ModuleDef'):
+            from pyverilog.vparser import ast as vast
+
             name = node.name
             variables = []
             for item in node.items:
@@ -60,7 +222,9 @@ class VerilogApi(object):
                 'vars': variables
             }
 
-        def _parse_modules(self, node: vast.Source):
+        def _parse_modules(self, node: 'vast.Source'):
+            from pyverilog.vparser import ast as vast
+
             q = [node]
             modules = {}
             while len(q) > 0:
@@ -74,27 +238,63 @@ class VerilogApi(object):
             return modules
 
         def parse(self):
-            tmp_file = str(random.randint(1, 100000000))
-            codeparser = VerilogCodeParser(
-                [self._file],
-                preprocess_output=tmp_file,
-                preprocess_include=None,
-                preprocess_define=None,
-                outputdir='.',
-                debug=False
-            )
-            ast = codeparser.parse()
+            from pyverilog.vparser.parser import VerilogCodeParser
+
+            # the preprocessor output is a temporary file, the parser tables are cached in the working directory
+            tmp_folder = tempfile.mkdtemp(prefix='pyverilog_')
+            try:
+                codeparser = VerilogCodeParser(
+                    [self._file],
+                    preprocess_output=os.path.join(tmp_folder, 'preprocessed.v'),
+                    preprocess_include=None,
+                    preprocess_define=None,
+                    outputdir='.',
+                    debug=False
+                )
+                ast = codeparser.parse()
+            finally:
+                shutil.rmtree(tmp_folder, ignore_errors=True)
             return self._parse_modules(ast)
 
+    # {module: [array names]} of a verilog file: the regular expression scan (_scan_arrays) unless it is
+    # ambiguous for the modules (not exactly one array in every one of them), pyverilog otherwise.
+    # The result is cached in cache_folder by the hash of the file content
+    @staticmethod
+    def _array_candidates(path, modules, cache_folder=None):
+        with open(path, 'rb') as f:
+            content = f.read()
+        cache_path = None
+        if cache_folder is not None:
+            cache_path = os.path.join(cache_folder, f'arrays_{hashlib.sha256(content).hexdigest()}.json')
+            if os.path.isfile(cache_path):
+                with open(cache_path) as f:
+                    return json.load(f)
+
+        arrays = _scan_arrays(content.decode('utf-8', errors='replace'))
+        if arrays is None or any(map(lambda x: len(arrays.get(x, [])) != 1, modules)):
+            parsed = VerilogApi.ModuleParser(path).parse()
+            arrays = dict(map(
+                lambda x: (x[0], list(map(lambda v: v['name'], filter(lambda v: v['dimensions'] is not None, x[1])))),
+                parsed.items()
+            ))
+
+        if cache_path is not None:
+            os.makedirs(cache_folder, exist_ok=True)
+            # several testers may share the cache folder
+            tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(arrays, f)
+            os.replace(tmp_path, cache_path)
+        return arrays
+
+    # cache_folder - the deduced arrays are cached there (see _array_candidates)
     @staticmethod
     def deduce_array_names(cpu_files_folder,
                            registers_array_name,
                            memory_array_name,
-                           instructions_array_name
+                           instructions_array_name,
+                           cache_folder=None
                            ):
-        def find_multidimensional_vars(vars):
-            return list(map(lambda x: x['name'], filter(lambda x: x['dimensions'] is not None, vars)))
-
         def deduce_name(cur_val, modules, mod_name, default_name):
             if cur_val is not None:
                 return cur_val
@@ -102,7 +302,7 @@ class VerilogApi(object):
             deduced_name = default_name
 
             if mod_name in modules:
-                candidates = find_multidimensional_vars(modules[mod_name])
+                candidates = modules[mod_name]
                 if len(candidates) > 0:
                     if len(candidates) > 1:
                         print(
@@ -116,8 +316,9 @@ class VerilogApi(object):
 
         memory_module_path = os.path.join(cpu_files_folder, 'memory.v')
         registers_module_path = os.path.join(cpu_files_folder, 'register_file.v')
-        mem_modules = VerilogApi.ModuleParser(memory_module_path).parse()
-        reg_modules = VerilogApi.ModuleParser(registers_module_path).parse()
+        mem_modules = VerilogApi._array_candidates(memory_module_path, ('data_memory', 'instruction_memory'),
+                                                   cache_folder)
+        reg_modules = VerilogApi._array_candidates(registers_module_path, ('register_file',), cache_folder)
 
         registers_array_name = deduce_name(
             registers_array_name,
@@ -142,6 +343,78 @@ class VerilogApi(object):
 
         return registers_array_name, memory_array_name, instructions_array_name
 
+    @staticmethod
+    def _build_hash(test_path,
+                    cpu_files_folder,
+                    iverilog_build_flags,
+                    instructions_array_name,
+                    registers_array_name,
+                    memory_array_name,
+                    instances
+                    ):
+        h = hashlib.sha256()
+        for part in (iverilog_build_flags, instructions_array_name, registers_array_name, memory_array_name,
+                     instances):
+            h.update(str(part).encode('utf-8'))
+            h.update(b'\0')
+
+        sources = [test_path]
+        for root, _, files in os.walk(cpu_files_folder):
+            for name in files:
+                sources.append(os.path.join(root, name))
+
+        for path in sorted(set(map(os.path.abspath, sources))):
+            h.update(os.path.basename(path).encode('utf-8'))
+            h.update(b'\0')
+            with open(path, 'rb') as f:
+                h.update(f.read())
+            h.update(b'\0')
+        return h.hexdigest()
+
+    # compiles the test bench (or reuses a cached build of the same sources) and returns the path to the vvp binary
+    @staticmethod
+    def compile_tests(test_path,
+                      build_folder_path,
+                      iverilog_build_flags,
+                      cpu_files_folder,
+                      instructions_array_name,
+                      registers_array_name,
+                      memory_array_name,
+                      instances=None
+                      ):
+        build_folder_path = os.path.join(os.getcwd(), build_folder_path)
+        if not os.path.isdir(build_folder_path):
+            os.makedirs(build_folder_path, exist_ok=True)
+
+        build_hash = VerilogApi._build_hash(
+            test_path,
+            cpu_files_folder,
+            iverilog_build_flags,
+            instructions_array_name,
+            registers_array_name,
+            memory_array_name,
+            instances
+        )
+        build_file_path = os.path.join(build_folder_path, f'{build_hash}.vvp')
+        if os.path.isfile(build_file_path):
+            return build_file_path
+
+        tmp_file_path = f'{build_file_path}.{uuid.uuid4().hex}.tmp'
+        subprocess.check_output([
+            'iverilog',
+            '-o', tmp_file_path,
+            *shlex.split(iverilog_build_flags),
+            '-I', cpu_files_folder,
+            f'-DMEM_ARR={memory_array_name}',
+            f'-DREG_ARR={registers_array_name}',
+            f'-DINSTR_ARR={instructions_array_name}',
+            *([] if instances is None else [f'-DINSTANCES={instances}']),
+            test_path
+        ])
+        # several testers may share the cache folder, so the build is published atomically
+        os.replace(tmp_file_path, build_file_path)
+        return build_file_path
+
     def __init__(self,
                  test_path,
                  build_folder_path,
@@ -151,7 +424,13 @@ class VerilogApi(object):
                  instructions_folder_path,
                  instructions_array_name,
                  registers_array_name,
-                 memory_array_name
+                 memory_array_name,
+                 build_file_path=None,
+                 server_mode=False,
+                 instances=1,
+                 memory_cells=0,
+                 dump_format='binary',
+                 metrics=None
                  ):
 
         self.test_path = test_path
@@ -160,89 +439,258 @@ class VerilogApi(object):
         self._build_folder_path = build_folder_path
         self._iverilog_build_flags = iverilog_build_flags
         self._max_instructions = max_instructions
-        self._build_file_name = str(random.randint(1, 1 << 30))
-        self._instructions_file_name = str(random.randint(1, 1 << 30))
+        # unique per instance: the workers (threads, processes, shards) share the instructions folder
+        self._instructions_file_name = uuid.uuid4().hex
         self._instructions_array_name = instructions_array_name
         self._registers_array_name = registers_array_name
         self._memory_array_name = memory_array_name
-        self._init_build_folder()
+        self._instances = instances
         self._init_instructions_folder()
-        self._compile_tests()
+        if build_file_path is None:
+            build_file_path = VerilogApi.compile_tests(
+                test_path,
+                build_folder_path,
+                iverilog_build_flags,
+                cpu_files_folder,
+                instructions_array_name,
+                registers_array_name,
+                memory_array_name,
+                instances if instances > 1 else None
+            )
+        self._build_file_path = build_file_path
+        self._server_mode = server_mode
+        self._server = None
+        self._server_output = None
+        # the dumps are decoded into arrays of at least memory_cells cells
+        self._memory_cells = memory_cells
+        # 'binary', 'hex' (+hex_dump) or 'sparse' (+sparse_dump)
+        self._dump_format = dump_format
+        # the phases of a run: 'write' (the program files), 'spawn' (vvp), 'simulate', 'decode' (the dumps)
+        self._metrics = Metrics(enabled=False) if metrics is None else metrics
 
     def _get_instructions_file_path(self):
         return os.path.join(self._get_instructions_folder_path(), self._instructions_file_name)
 
-    def _get_build_folder_path(self):
-        return os.path.join(os.getcwd(), self._build_folder_path)
+    def _get_slot_file_path(self, slot):
+        return f'{self._get_instructions_file_path()}_{slot}'
+
+    def _get_manifest_file_path(self):
+        return f'{self._get_instructions_file_path()}_manifest'
 
     def _get_instructions_folder_path(self):
         return os.path.join(os.getcwd(), self._instructions_folder_path)
 
     def _get_build_file_path(self):
-        return os.path.join(self._get_build_folder_path(), self._build_file_name)
+        return self._build_file_path
 
     def _init_instructions_folder(self):
         if not os.path.isdir(self._get_instructions_folder_path()):
-            os.mkdir(self._get_instructions_folder_path())
-
-    def _init_build_folder(self):
-        if not os.path.isdir(self._get_build_folder_path()):
-            os.mkdir(self._get_build_folder_path())
-
-    def _compile_tests(self):
-        subprocess.check_output(
-            f'iverilog -o {self._get_build_file_path()} {self._iverilog_build_flags} -I {self._cpu_files_folder} -DMEM_ARR="{self._memory_array_name}" -DREG_ARR="{self._registers_array_name}" -DINSTR_ARR="{self._instructions_array_name}" -DSOURCE_FILE="\\"{self._instructions_folder_path}/{self._instructions_file_name}\\"" {self.test_path}'
-        )
-
-    def _write_instructions(self, instructions: [Instruction]):
-        if len(instructions) >= self._max_instructions:
+            os.makedirs(self._get_instructions_folder_path(), exist_ok=True)
+
+    # instructions - a list of instructions or a Program, written as hex words (+hex) followed by a breakpoint
+    def _write_instructions(self, instructions, path=None):
+        if path is None:
+            path = self._get_instructions_file_path()
+        program = Program.from_instructions(instructions)
+        if len(program) >= self._max_instructions:
             print('WARNING: can\'t safely reserve a cell for a breakpoint!')
-            instructions = instructions[:self._max_instructions - 1]
-        lines = '\n'.join(map(lambda x: x.binary(), instructions))
-        with open(self._get_instructions_file_path(), 'w') as f:
-            f.write(lines)
-            # breakpoint
-            f.write('\n' + '0' * 32)
-
-    def _decode_tests_output(self, out):
-        memory, registers = [], []
-        memory_reading, reg_reading = False, False
-        out = out.decode(encoding='utf-8')
-        lines = out.split(os.linesep)
+            program = program[:self._max_instructions - 1]
+        program.write_readmemh(path)
+
+    def _decoder(self, instances=None):
+        return DumpDecoder(memory_size=self._memory_cells, instances=instances)
+
+    def _dump_args(self):
+        if self._dump_format == 'binary':
+            return ['+hex']
+        return ['+hex', f'+{self._dump_format}_dump']
+
+    # feeds the lines to the decoder until it is finished, returns the time spent in the decoder
+    # (only measured with the metrics enabled)
+    def _decode(self, lines, decoder):
+        if not self._metrics.enabled:
+            for line in lines:
+                if decoder.feed(line):
+                    break
+            return 0.0
+        decoding = 0.0
         for line in lines:
-            line = line.strip()
-            if line == 'MEMORY_DUMP_BEGIN':
-                memory_reading = True
-            elif line == 'MEMORY_DUMP_END':
-                memory_reading = False
-            elif line == 'REG_DUMP_BEGIN':
-                reg_reading = True
-            elif line == 'REG_DUMP_END':
-                reg_reading = False
-            elif line == 'FINISH':
+            started = time.perf_counter()
+            finished = decoder.feed(line)
+            decoding += time.perf_counter() - started
+            if finished:
                 break
-            else:
-                if memory_reading:
-                    parts = list(filter(lambda x: len(x) > 0, line.split(' ')))
-                    index, value = int(parts[0]), twos_comp(int(parts[1], 2), 32)
-                    _expand_array(memory, index + 1)
-                    memory[index] = value
-
-                if reg_reading:
-                    parts = list(filter(lambda x: len(x) > 0, line.split(' ')))
-                    index, value = int(parts[0]), twos_comp(int(parts[1], 2), 32)
-                    _expand_array(registers, index + 1)
-                    registers[index] = value
-        return registers, memory
+        return decoding
+
+    # streams the output of a simulator run through the decoder, the simulator is killed after time_out ms
+    def _run_process(self, command, time_out, decoder):
+        started = time.perf_counter()
+        process = subprocess.Popen(command, stdout=subprocess.PIPE)
+        spawned = time.perf_counter()
+        self._metrics.add('spawn', spawned - started)
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            process.kill()
+
+        timer = None
+        if time_out is not None:
+            timer = threading.Timer(time_out / 1000, kill)
+            timer.start()
+        decoding = 0.0
+        try:
+            decoding = self._decode(process.stdout, decoder)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            process.stdout.close()
+            process.wait()
+        self._metrics.add('decode', decoding)
+        self._metrics.add('simulate', time.perf_counter() - spawned - decoding)
+
+        if not decoder.finished:
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(command, time_out / 1000)
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, command)
+        return decoder
 
-    def close(self):
-        shutil.rmtree(self._get_build_folder_path(), ignore_errors=True)
-        shutil.rmtree(self._get_instructions_folder_path(), ignore_errors=True)
+    @staticmethod
+    def _read_server_output(server, output: queue.Queue):
+        for line in iter(server.stdout.readline, b''):
+            output.put(line.strip())
+        output.put(None)
+
+    def _stop_server(self):
+        if self._server is None:
+            return
+        try:
+            self._server.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._server.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self._server.kill()
+            self._server.wait()
+        self._server = None
+        self._server_output = None
+
+    def _read_server_line(self, deadline):
+        try:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            line = self._server_output.get(timeout=timeout)
+        except queue.Empty:
+            self._server.kill()
+            self._stop_server()
+            raise TimeoutError('simulator server timeout...')
+        if line is None:
+            self._stop_server()
+            raise RuntimeError('simulator server exited unexpectedly')
+        return line
+
+    def _wait_server_ready(self, deadline):
+        while True:
+            line = self._read_server_line(deadline)
+            if line == b'READY':
+                return True
+            if line == b'RESTART':
+                self._stop_server()
+                return False
+
+    def _start_server(self, deadline):
+        self._server = subprocess.Popen(
+            ['vvp', '-n', self._get_build_file_path(), '+server', *self._dump_args(),
+             f'+max_instructions={self._max_instructions}'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE
+        )
+        self._server_output = queue.Queue()
+        threading.Thread(
+            target=VerilogApi._read_server_output,
+            args=(self._server, self._server_output),
+            daemon=True
+        ).start()
+        self._wait_server_ready(deadline)
+
+    def _run_server(self, time_out, max_cycles):
+        deadline = None if time_out is None else time.monotonic() + time_out / 1000
+        if self._server is None:
+            started = time.perf_counter()
+            self._start_server(deadline)
+            self._metrics.add('spawn', time.perf_counter() - started)
+
+        try:
+            self._server.stdin.write(f'{self._get_instructions_file_path()} {max_cycles or 0}\n'.encode('utf-8'))
+            self._server.stdin.flush()
+        except OSError:
+            self._stop_server()
+            raise
+
+        started = time.perf_counter()
+        decoder = self._decoder()
+        try:
+            decoding = self._decode(iter(lambda: self._read_server_line(deadline), None), decoder)
+        except Exception:
+            # the rest of the dump would be read as the output of the next program, the next run restarts the server
+            if self._server is not None:
+                self._server.kill()
+                self._stop_server()
+            raise
+        # the server either waits for the next program or asks to be restarted
+        self._wait_server_ready(deadline)
+        self._metrics.add('decode', decoding)
+        self._metrics.add('simulate', time.perf_counter() - started - decoding)
+        return decoder.result()
 
-    def run(self, instructions: [Instruction], time_out=None):
-        if time_out is None:
-            time_out = 2 ** 42
+    def close(self):
+        self._stop_server()
+        # the build folder is a cache shared between testers, so only the instructions files are removed
+        paths = [self._get_instructions_file_path(), self._get_manifest_file_path()]
+        paths.extend(map(self._get_slot_file_path, range(self._instances)))
+        for path in paths:
+            if os.path.isfile(path):
+                os.remove(path)
+
+    # runs a batch of programs on a multi-instance test bench (one cpu per program)
+    # and returns a (registers, memory) dump per program (None if the program did not reach its breakpoint,
+    # a CycleLimitExceeded if it ran more than its max_cycles)
+    def run_many(self, programs, time_out=None, max_cycles=None):
+        if max_cycles is None:
+            max_cycles = [0] * len(programs)
+        dumps = []
+        for start in range(0, len(programs), self._instances):
+            batch = programs[start:start + self._instances]
+            started = time.perf_counter()
+            for slot, instructions in enumerate(batch):
+                self._write_instructions(instructions, self._get_slot_file_path(slot))
+            with open(self._get_manifest_file_path(), 'w') as f:
+                f.write('\n'.join(map(
+                    lambda slot: f'{self._get_slot_file_path(slot)} {max_cycles[start + slot] or 0}',
+                    range(len(batch))
+                )))
+            self._metrics.add('write', time.perf_counter() - started)
+
+            command = ['vvp', '-n', self._get_build_file_path(), *self._dump_args(),
+                       f'+programs={self._get_manifest_file_path()}']
+            dumps.extend(self._run_process(command, time_out, self._decoder(len(batch))).dumps)
+        return dumps
+
+    # time_out - milliseconds of wall clock, max_cycles - simulated cpu cycles (None - no limit)
+    def run(self, instructions, time_out=None, max_cycles=None):
+        if self._instances > 1:
+            dump = self.run_many([instructions], time_out=time_out, max_cycles=[max_cycles])[0]
+            if dump is None:
+                raise RuntimeError('the program did not reach its breakpoint')
+            if isinstance(dump, CycleLimitExceeded):
+                raise dump
+            return dump
+        started = time.perf_counter()
         self._write_instructions(instructions)
-        command = f'vvp {self._get_build_file_path()}'
-        output = subprocess.check_output(command, timeout=time_out / 1000)
-        return self._decode_tests_output(output)
+        self._metrics.add('write', time.perf_counter() - started)
+        if self._server_mode:
+            return self._run_server(time_out, max_cycles)
+        command = ['vvp', '-n', self._get_build_file_path(), *self._dump_args(),
+                   f'+program={self._get_instructions_file_path()}', f'+max_cycles={max_cycles or 0}']
+        return self._run_process(command, time_out, self._decoder()).result()
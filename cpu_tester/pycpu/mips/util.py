@@ -6,4 +6,9 @@ def twos_comp(val, bits):
 
 def bindigits(n, bits):
     s = bin(n & int("1"*bits, 2))[2:]
-    return ("{0:0>%s}" % (bits)).format(s)
\ No newline at end of file
+    return ("{0:0>%s}" % (bits)).format(s)
+
+
+# wraps an integer to a signed 32-bit value (as a 32-bit register would)
+def wrap32(val):
+    return ((int(val) + 0x80000000) & 0xFFFFFFFF) - 0x80000000
@@ -1,3 +1,4 @@
+import argparse
 import json
 import os
 import random
@@ -6,15 +7,61 @@ import sys
 from pycpu.mips.tests.config import Config
 from pycpu.mips.tests.test_bench import TestBench
 
+
+def parse_shard(value):
+    try:
+        i, n = map(int, value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected i/n, got \'{value}\'')
+    if not 0 <= i < n:
+        raise argparse.ArgumentTypeError(f'the shard must be in 0..{n - 1}')
+    return i, n
+
+
 if __name__ == '__main__':
-    args = sys.argv[1:]
-    config_path = 'config.json'
-    if len(args) > 0:
-        config_path = args[0]
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config', nargs='?', default='config.json')
+    parser.add_argument('--seed', type=int, help='the seed of the run (overrides the config)')
+    parser.add_argument('--shard', type=parse_shard,
+                        help='i/n - run the i-th (from 0) of n disjoint slices of the tests')
+    parser.add_argument('--job', type=int, help='run only the test with this id (regenerates its program)')
+    parser.add_argument('--summary', help='write the summary of the run to this json file (see merge.py)')
+    parser.add_argument('--store', help='write the results to this sqlite database (overrides the config)')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted run, skipping the jobs already in the result store')
+    parser.add_argument('--replay', nargs='+', metavar='FOLDER',
+                        help='test the programs of the \'.dat\' and \'_bin\' files of the folders '
+                             'instead of generated ones (overrides the config)')
+    args = parser.parse_args(sys.argv[1:])
 
-    config = Config.from_file(config_path)
+    config = Config.from_file(args.config)
+    if args.seed is not None:
+        config.seed = args.seed
+    if args.store is not None:
+        config.result_store = args.store
+    if args.replay is not None:
+        config.replay_folders = args.replay
+    if args.resume and config.result_store is None:
+        parser.error('--resume needs a result store (--store or \'result_store\' in the config)')
+    if (args.shard is not None or args.job is not None) and config.seed is None and not args.resume and \
+            config.replay_folders is None:
+        parser.error('--shard and --job need the seed of the run (--seed or \'seed\' in the config)')
+    if (args.shard is not None or args.job is not None) and not TestBench.regenerates_jobs(config):
+        parser.error('--shard and --job regenerate the programs from the seed and the job ids, '
+                     f'the \'{config.program_generator}\' generator depends on the results of the run '
+                     '(rerun its saved failures with --replay)')
 
-    test_bench = TestBench(config)
-    test_bench.run()
+    # the replayed programs are loaded once, their number is the number of the tests
+    replay = None
+    if config.replay_folders is not None:
+        replay = TestBench.create_generator(config)
+        config.tests = len(replay)
 
+    jobs = None
+    if args.job is not None:
+        jobs = range(args.job, args.job + 1)
+    elif args.shard is not None:
+        jobs = TestBench.shard(config.tests, *args.shard)
 
+    test_bench = TestBench(config, jobs=jobs, summary_path=args.summary, resume=args.resume, replay=replay)
+    test_bench.run()
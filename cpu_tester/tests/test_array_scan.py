@@ -0,0 +1,40 @@
+import glob
+import os
+import shutil
+
+import pytest
+
+from pycpu.mips.tests.verilog_api import VerilogApi, _scan_arrays
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the cpu of the tester and the template the students start from
+SOURCES = sorted(glob.glob(os.path.join(ROOT, 'cpu', '*.v')) +
+                 glob.glob(os.path.join(os.path.dirname(ROOT), 'cpu_template', '*.v')))
+
+
+def _scan(path):
+    with open(path) as f:
+        return _scan_arrays(f.read())
+
+
+def test_scan_finds_the_arrays_of_the_cpu():
+    assert _scan(os.path.join(ROOT, 'cpu', 'register_file.v')) == {'register_file': ['registers']}
+    assert _scan(os.path.join(ROOT, 'cpu', 'memory.v')) == {'data_memory': ['mem_'], 'instruction_memory': ['ram']}
+    # the test benches use the preprocessor, only pyverilog can read them
+    assert _scan(os.path.join(ROOT, 'cpu', 'cpu_test.v')) is None
+
+
+# pyverilog runs the preprocessor of iverilog
+@pytest.mark.skipif(shutil.which('iverilog') is None, reason='iverilog is not installed')
+@pytest.mark.parametrize('path', SOURCES, ids=lambda x: os.path.relpath(x, os.path.dirname(ROOT)))
+def test_scan_matches_pyverilog(path, tmp_path, monkeypatch):
+    scanned = _scan(path)
+    if scanned is None:
+        pytest.skip('the scan leaves the file to pyverilog')
+    # the parser tables are written to the working directory
+    monkeypatch.chdir(tmp_path)
+    parsed = VerilogApi.ModuleParser(path).parse()
+    assert scanned == dict(map(
+        lambda x: (x[0], list(map(lambda v: v['name'], filter(lambda v: v['dimensions'] is not None, x[1])))),
+        parsed.items()
+    ))
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from pycpu.mips.batch import BatchMIPS
+from pycpu.mips.instructions import *
+from pycpu.mips.mips import MIPS
+from pycpu.mips.tests.program_generator import ProgramGenerator
+
+MEMORY_CELLS = 16
+MAX_STEPS = 5000
+
+# the corner cases of the semantics: 32-bit wrapping, negative memory cells (counted from the end, as in a list),
+# a memory access out of range, a loop that runs long enough to be compiled by 'blocks' and a loop that never ends
+PROGRAMS = [
+    [ADDI(0, 1, 32767), ADD(1, 1, 2), ADD(2, 2, 2), ADD(2, 2, 2), ADD(2, 2, 2), ADD(2, 2, 2),
+     ADD(2, 2, 2), ADD(2, 2, 2), ADD(2, 2, 2), ADD(2, 2, 2), ADD(2, 2, 2), ADD(2, 2, 2), ADD(2, 2, 2),
+     ADD(2, 2, 2), ADD(2, 2, 2), ADD(2, 2, 2), ADD(2, 2, 2), ADD(2, 2, 2), ADD(2, 2, 2), SUB(0, 2, 3), SLT(3, 2, 4)],
+    [ADDI(0, 1, -8), SW(1, 1, 0), LW(0, 2, -4), SW(0, 2, 12)],
+    [ADDI(0, 1, 4 * MEMORY_CELLS), SW(1, 1, 0)],
+    [ADDI(0, 1, 200), ADDI(0, 5, 1), ADDI(2, 2, 1), SW(0, 2, 4), SLT(2, 1, 3), BEQ(3, 5, -4)],
+    [ADDI(0, 1, 1), BEQ(0, 0, -1)],
+]
+
+
+def _programs():
+    generator = ProgramGenerator(MEMORY_CELLS, amount=60, loop_probability=0.4)
+    return PROGRAMS + list(map(lambda x: generator.generate(random.Random(x)), range(40)))
+
+
+# (registers, memory, steps) after the run or the type of the error
+def _run(engine, memory, program):
+    cpu = MIPS(mem_size=MEMORY_CELLS, engine=engine, memory=memory)
+    cpu.set_instructions(program)
+    try:
+        cpu.run(max_steps=MAX_STEPS)
+    except (IndexError, TimeoutError) as ex:
+        return type(ex)
+    return cpu.registers, list(cpu.memory), cpu.steps
+
+
+@pytest.mark.parametrize('memory', ['list', 'paged'])
+@pytest.mark.parametrize('engine', ['fast', 'blocks'])
+def test_engines_match_objects(engine, memory):
+    for program in _programs():
+        assert _run(engine, memory, program) == _run('objects', 'list', program)
+
+
+@pytest.mark.parametrize('scalar_lanes', [1, 64])
+def test_batch_matches_objects(scalar_lanes, monkeypatch):
+    monkeypatch.setattr(BatchMIPS, 'SCALAR_LANES', scalar_lanes)
+    programs = _programs()
+    batch = BatchMIPS(mem_size=MEMORY_CELLS)
+    batch.run(programs, max_steps=MAX_STEPS)
+    for i, program in enumerate(programs):
+        expected = _run('objects', 'list', program)
+        if isinstance(expected, type):
+            assert i in batch.errors
+            assert bool(batch.timed_out[i]) == (expected is TimeoutError)
+            continue
+        cpu = batch.lane(i)
+        assert (cpu.registers, cpu.memory, cpu.steps) == expected
+
+
+def test_reset_clears_the_written_cells():
+    for engine, memory in [('fast', 'list'), ('fast', 'paged'), ('blocks', 'list')]:
+        cpu = MIPS(mem_size=MEMORY_CELLS, engine=engine, memory=memory)
+        cpu.set_instructions(PROGRAMS[1])
+        cpu.run()
+        assert cpu.memory_snapshot() != {}
+        cpu.reset()
+        assert list(cpu.memory) == [0] * MEMORY_CELLS and cpu.memory_snapshot() == {}
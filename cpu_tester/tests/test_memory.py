@@ -0,0 +1,28 @@
+import pytest
+
+from pycpu.mips.memory import PagedMemory
+
+
+def test_pages_are_allocated_on_write():
+    memory = PagedMemory(4096, page_bits=8)
+    assert memory[5] == 0 and memory._pages == {}
+    memory[5] = 1
+    memory[-1] = 2
+    assert sorted(memory._pages) == [0, 15]
+    assert memory[5] == 1 and memory[4095] == 2 and memory[:3] == [0, 0, 0]
+    with pytest.raises(IndexError):
+        memory[4096] = 3
+
+
+def test_reset_touches_only_the_written_pages():
+    memory = PagedMemory(4096, page_bits=8)
+    memory[5] = 1
+    memory[300] = 2
+    pages = dict(memory._pages)
+    memory.reset()
+    # the old pages read as zeros and only the page written again is replaced
+    assert list(memory) == [0] * 4096
+    memory[301] = 3
+    assert memory._pages[0] is pages[0] and memory._pages[1] is not pages[1]
+    assert memory[300] == 0 and memory[301] == 3 and memory[5] == 0
+    assert sorted(memory._pages) == [0, 1]
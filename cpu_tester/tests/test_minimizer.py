@@ -0,0 +1,51 @@
+from pycpu.mips.instructions import *
+from pycpu.mips.program import OP_ADD, OP_SLT, Program
+from pycpu.mips.tests.minimizer import Minimizer, reduce_program
+from pycpu.mips.tests.test_bench import TestBench
+
+PROGRAM = Program.from_instructions([
+    ADDI(0, 1, 1),
+    ADDI(0, 2, 2),
+    BEQ(0, 0, 2),
+    ADDI(0, 3, 3),
+    ADDI(0, 4, 4),
+    SW(0, 1, 0),
+    BEQ(1, 2, -6),
+    BEQ(0, 0, 100),
+])
+
+
+def _offsets(program):
+    args = program.fields()[3]
+    return list(map(lambda x: x[1], filter(lambda x: isinstance(x[0], BEQ), zip(program.instructions(), args))))
+
+
+def test_reduce_keeps_the_branch_targets():
+    # the targets are kept: 2 -> 5 and 6 -> 1 (new 1 -> 3 and 4 -> 0)
+    assert _offsets(reduce_program(PROGRAM, [1, 2, 4, 5, 6])) == [1, -5]
+    # a removed target moves to the next kept instruction (5 -> 6, 1 -> 2), past the end stays past the end
+    assert _offsets(reduce_program(PROGRAM, [0, 2, 3, 6, 7])) == [1, -3, 0]
+    assert len(reduce_program(PROGRAM, [])) == 0
+
+
+# a program fails with 'slt' if it has an slt after an add, with 'other' if it has only the slt
+def _evaluate(programs):
+    results = []
+    for i, program in enumerate(programs):
+        ops = program.fields()[0]
+        signature = None
+        if OP_SLT in ops:
+            signature = 'slt' if OP_ADD in ops[:ops.index(OP_SLT)] else 'other'
+        results.append(TestBench.Result(i, ok=signature is None, message=signature, signature=signature))
+    return results
+
+
+def test_minimize_keeps_the_signature():
+    program = Program.from_instructions(
+        [ADDI(0, 1, i) for i in range(10)] + [ADD(1, 2, 3)] + [ADDI(0, 1, i) for i in range(10)] + [SLT(3, 1, 4)] +
+        [SUB(1, 2, 3)] * 5)
+    failure = _evaluate([program])[0]
+    minimizer = Minimizer(_evaluate, max_tests=500)
+    minimized = minimizer.minimize(program, failure)
+    assert list(map(type, minimized.instructions())) == [ADD, SLT]
+    assert 0 < minimizer.tests <= 500
@@ -0,0 +1,41 @@
+import random
+
+import numpy as np
+
+from pycpu.mips.instructions import *
+from pycpu.mips.program import Program, decode_fields, encode_fields
+from pycpu.mips.tests.program_generator import ProgramGenerator
+
+# every instruction with the extreme values of its fields
+EDGES = [ADD(31, 0, 31), SUB(1, 2, 3), AND(0, 31, 0), OR(5, 6, 7), SLT(31, 31, 31),
+         ADDI(0, 31, -32768), ADDI(31, 0, 32767), LW(1, 2, -4), SW(3, 4, 32764), BEQ(0, 0, -1), BEQ(7, 8, 32767)]
+
+
+def _programs():
+    generator = ProgramGenerator(64, amount=100)
+    return [Program.from_instructions(EDGES)] + list(
+        map(lambda x: generator.generate_program(random.Random(x)), range(20)))
+
+
+def test_instructions_round_trip():
+    program = Program.from_instructions(EDGES)
+    assert list(map(lambda x: x.binary(), program.instructions())) == list(map(lambda x: x.binary(), EDGES))
+    assert list(map(lambda x: format(x, '032b'), program.words)) == list(map(lambda x: x.binary(), EDGES))
+    assert Program.from_instructions(program.instructions()) == program
+
+
+def test_vectorized_fields_match_the_scalar_ones():
+    for program in _programs():
+        fields = program.fields()
+        assert list(map(lambda x: x.tolist(), decode_fields(np.asarray(program.words)))) == list(fields)
+        assert encode_fields(*fields).tolist() == list(program.words)
+        assert Program.from_fields(*fields) == program
+
+
+def test_readmem_round_trip():
+    for program in _programs():
+        binary, hexadecimal = program.readmemb(), program.readmemh()
+        assert binary.split()[-1] == '0' * 32 and hexadecimal.split()[-1] == '0' * 8
+        assert Program.from_text(binary)[:-1] == program
+        assert Program.from_text(hexadecimal, base=16)[:-1] == program
+        assert Program.from_text(program.readmemb(breakpoint=False)) == program
@@ -0,0 +1,23 @@
+import random
+
+import pytest
+
+from pycpu.mips.tests.fuzzer import MutationFuzzer
+from pycpu.mips.tests.program_generator import CoverageGuidedGenerator, ProgramGenerator
+
+
+def _fuzzer(memory_cells):
+    seeds = [ProgramGenerator(memory_cells).generate_program() for _ in range(4)]
+    return MutationFuzzer(memory_cells, seeds=seeds)
+
+
+@pytest.mark.parametrize('create', [ProgramGenerator, CoverageGuidedGenerator, _fuzzer])
+def test_jobs_do_not_depend_on_the_generation_order(create):
+    generator = create(16)
+    state = random.getstate()
+    forward = [generator.generate_job(7, job_id) for job_id in range(1, 33)]
+    backward = [generator.generate_job(7, job_id) for job_id in range(32, 0, -1)]
+    assert forward == backward[::-1]
+    assert len(set(forward)) > 1
+    # the process-wide random is left to the threads that use it
+    assert random.getstate() == state
@@ -0,0 +1,58 @@
+import glob
+import os
+
+from pycpu.mips.instructions import *
+from pycpu.mips.tests.replay import load_replay, replay_paths
+
+SAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                       'programs_samples')
+
+
+# the program of a $readmemb file parsed a word at a time, up to the first zero word (None - a word is not supported)
+def _parse(path):
+    instructions = []
+    with open(path) as f:
+        for word in f.read().replace('_', '').split():
+            if int(word, 2) == 0:
+                break
+            instruction = parse_instruction(word)
+            if instruction is None:
+                return None
+            instructions.append(instruction)
+    return list(map(lambda x: x.binary(), instructions))
+
+
+def _binaries(program):
+    return None if program is None else list(map(lambda x: x.binary(), program.instructions()))
+
+
+def test_samples_match_parse_instruction():
+    paths = replay_paths([SAMPLES])
+    assert paths == sorted(glob.glob(os.path.join(SAMPLES, '*.dat')))
+    programs, skipped = load_replay(paths)
+    assert skipped == []
+    assert list(map(_binaries, programs)) == list(map(_parse, paths))
+
+
+def test_files_that_cant_be_replayed_are_skipped(tmp_path):
+    files = {
+        'program.dat': f'{ADDI(0, 1, 5).binary()}\n{SW(0, 1, -4).binary()[:16]}_{SW(0, 1, -4).binary()[16:]}\n'
+                       f'{"0" * 32}\n{ADD(1, 1, 2).binary()}\n',
+        'empty.dat': '\n',
+        'breakpoint.dat': '0' * 32 + '\n',
+        'unsupported.dat': f'{ADDI(0, 1, 5).binary()}\n{"1" * 32}\n',
+        'short.dat': '0101\n',
+        'digits.dat': '2' * 32 + '\n',
+        'long.dat': f'{ADDI(0, 1, 5).binary()}\n' * 4,
+    }
+    paths = []
+    for name, text in files.items():
+        (tmp_path / name).write_text(text)
+        paths.append(str(tmp_path / name))
+    paths.append(str(tmp_path / 'missing.dat'))
+
+    programs, skipped = load_replay(paths, max_length=3)
+    assert _binaries(programs[0]) == _parse(paths[0]) == [ADDI(0, 1, 5).binary(), SW(0, 1, -4).binary()]
+    assert programs[1:] == [None] * 7
+    assert sorted(map(lambda x: os.path.basename(x[0]), skipped)) == sorted(list(files)[1:] + ['missing.dat'])
+    assert dict(skipped)[paths[3]] == f'unsupported word {"1" * 32} (pc=1)'
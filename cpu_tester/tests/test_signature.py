@@ -0,0 +1,59 @@
+from pycpu.mips.instructions import *
+from pycpu.mips.mips import MIPS
+from pycpu.mips.tests.config import Config
+from pycpu.mips.tests.summary import make_summary, merge_summaries
+from pycpu.mips.tests.test_bench import TestBench
+
+
+def _worker(tmp_path):
+    return TestBench.Worker(None, None, Config.from_file(str(tmp_path / 'missing.json')), None)
+
+
+# the result of the comparison of the program with the dumps of the emulator changed by bad_registers and bad_memory
+def _compare(worker, program, bad_registers=None, bad_memory=None):
+    cpu = MIPS(mem_size=worker._bench_config.memory_cells, engine='fast')
+    cpu.set_instructions(program)
+    cpu.run()
+    registers = list(map(cpu.read_reg, range(32)))
+    memory = cpu.memory_snapshot()
+    for x, value in (bad_registers or {}).items():
+        registers[x] = value
+    memory.update(bad_memory or {})
+    return worker._compare(cpu, TestBench.Job(program, 7), registers, memory)
+
+
+def test_signature_names_the_first_divergence_and_its_writer(tmp_path):
+    worker = _worker(tmp_path)
+    program = [ADDI(0, 1, 3), ADDI(0, 2, 5), SLT(1, 2, 5), SW(0, 2, 8)]
+    assert _compare(worker, program).is_ok()
+
+    res = _compare(worker, program, bad_registers={5: 0, 6: 1})
+    assert not res.is_ok() and res.job_id == 7 and res.source == 'cpu+verilog'
+    assert res.signature == 'registers check failed: $5 <- slt'
+    assert res.diff == [('$5', 1, 0), ('$6', 0, 1)]
+    # the memory is checked first, a cell nobody wrote has no writer
+    res = _compare(worker, program, bad_registers={5: 0}, bad_memory={2: 4})
+    assert res.signature == 'memory check failed: mem[2] <- sw' and res.diff == [('mem[2]', 5, 4)]
+    assert _compare(worker, program, bad_memory={4: 1}).signature == 'memory check failed: mem[4] <- none'
+
+
+def test_failures_of_the_same_bug_share_a_signature(tmp_path):
+    worker = _worker(tmp_path)
+    # other values and other programs, the same register written last by an slt
+    first = _compare(worker, [ADDI(0, 1, 3), SLT(0, 1, 5)], bad_registers={5: 0})
+    second = _compare(worker, [ADDI(0, 2, 9), ADDI(0, 3, 1), SLT(3, 2, 5), ADD(0, 0, 0)], bad_registers={5: 7})
+    other = _compare(worker, [ADDI(0, 5, 1)], bad_registers={5: 0})
+    assert first.signature == second.signature != other.signature
+    # the failures without a comparison are grouped by their source and the type of their message
+    assert TestBench.Result(1, ok=False, message='unexpected error: boom', source='cpu').signature == \
+        TestBench.Result(2, ok=False, message='unexpected error: other', source='cpu').signature == \
+        'cpu: unexpected error'
+    assert TestBench.Result(3).signature is None
+
+
+def test_summaries_merge_the_buckets():
+    first = make_summary(1, range(0, 10), 8, 2, {'a': [2, 1, [3]]})
+    second = make_summary(1, range(10, 20), 7, 3, {'a': [1, 1, [12]], 'b': [2, 1, [15]]})
+    merged = merge_summaries([second, first])
+    assert merged['jobs'] == [[0, 19]] and merged['passed'] == 15 and merged['failed'] == 5
+    assert merged['signatures'] == {'a': {'failures': 3, 'jobs': [3, 12]}, 'b': {'failures': 2, 'jobs': [15]}}
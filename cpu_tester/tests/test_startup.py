@@ -0,0 +1,40 @@
+import os
+import statistics
+import subprocess
+import sys
+
+# the modules that must not be imported at startup, they are loaded by the code paths that need them:
+# numpy by the vectorized parts (the batch engine, the bulk generator, the binary dumps),
+# pyverilog (and its parser generator) by the array name deduction when the scan is ambiguous
+HEAVY_MODULES = ['numpy', 'pyverilog', 'ply']
+# the import time of tester.py in milliseconds (the median of RUNS runs)
+BUDGET_MS = 100
+RUNS = 5
+
+
+# {module: (self us, cumulative us)} of the imports of the module in a new interpreter (python -X importtime)
+def _import_times(module):
+    env = dict(os.environ)
+    # the bytecode is cached as in an installed package, so the first run is a warm up
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=env,
+                             capture_output=True, text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def test_tester_starts_without_the_heavy_modules_within_the_budget():
+    _import_times('tester')
+    runs = list(map(lambda x: _import_times('tester'), range(RUNS)))
+    milliseconds = statistics.median(map(lambda x: x['tester'][1] / 1000, runs))
+
+    assert sorted(set(map(lambda x: x.split('.')[0], runs[-1])) & set(HEAVY_MODULES)) == []
+    slowest = sorted(runs[-1].items(), key=lambda x: -x[1][0])[:10]
+    assert milliseconds <= BUDGET_MS, 'the slowest modules: ' + ', '.join(
+        map(lambda x: f'{x[0]} {x[1][0] / 1000:.1f}ms', slowest))
@@ -0,0 +1,41 @@
+import pytest
+
+from pycpu.mips.tests.store import ResultStore
+from pycpu.mips.tests.test_bench import TestBench
+
+
+# a run interrupted with the jobs 0..3, 5 and 7 done (6 never finished) and a job of another shard (20)
+def _store(path):
+    store = ResultStore(str(path), batch_size=2)
+    store.open_run(5)
+    for job_id in [1, 0, 2, 5, 3, 7, 20]:
+        if job_id in [2, 5, 7]:
+            store.add(5, TestBench.Result(job_id, ok=False, message='registers check failed', source='cpu+verilog',
+                                          signature='sig' if job_id != 7 else 'other'))
+        else:
+            store.add(5, TestBench.Result(job_id))
+    store.close()
+    return ResultStore(str(path))
+
+
+def test_pending_skips_the_stored_jobs(tmp_path):
+    store = _store(tmp_path / 'results.db')
+    assert store.pending(range(0, 10)) == (4, {5, 7})
+    assert store.pending(range(4, 10)) == (4, {5, 7})
+    assert store.pending(range(10, 30)) == (10, {20})
+    assert store.pending(range(30, 40)) == (30, set())
+
+
+def test_counts_rebuild_the_buckets(tmp_path):
+    store = _store(tmp_path / 'results.db')
+    assert store.counts(range(0, 10), 1) == (3, 3, {'sig': [2, [2]], 'other': [1, [7]]})
+    assert store.counts(range(0, 10), 5) == (3, 3, {'sig': [2, [2, 5]], 'other': [1, [7]]})
+    assert store.counts(range(3, 6), 5) == (1, 1, {'sig': [1, [5]]})
+
+
+def test_a_store_belongs_to_one_run(tmp_path):
+    store = _store(tmp_path / 'results.db')
+    assert store.seed() == 5
+    store.open_run(5)
+    with pytest.raises(ValueError):
+        store.open_run(6)
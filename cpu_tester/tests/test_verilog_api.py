@@ -0,0 +1,64 @@
+import os
+import stat
+import sys
+
+import pytest
+
+from pycpu.mips.instructions import ADDI
+from pycpu.mips.tests.verilog_api import VerilogApi
+
+# a vvp server that answers a program starting with 'addi $1, $0, 0' with a dump of undefined bits
+# and any other program with registers and memory filled with the constant of its first instruction
+FAKE_VVP = f'''#!{sys.executable}
+import sys
+print('READY', flush=True)
+for line in sys.stdin:
+    with open(line.split()[0]) as f:
+        value = int(f.read().split()[0], 16) & 0xFFFF
+    if value == 0:
+        print('MEMORY_HEX xxxxxxxx 00000000')
+    else:
+        print('MEMORY_HEX ' + ' '.join([format(value, '08x')] * 4))
+    print('REG_HEX ' + ' '.join([format(value, '08x')] * 32))
+    print('FINISH')
+    print('READY', flush=True)
+'''
+
+
+@pytest.fixture
+def server_api(tmp_path, monkeypatch):
+    bin_folder = tmp_path / 'bin'
+    bin_folder.mkdir()
+    vvp = bin_folder / 'vvp'
+    vvp.write_text(FAKE_VVP)
+    vvp.chmod(vvp.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', f'{bin_folder}{os.pathsep}{os.environ["PATH"]}')
+
+    api = VerilogApi(
+        test_path=None,
+        build_folder_path=str(tmp_path / 'build'),
+        iverilog_build_flags='',
+        cpu_files_folder=None,
+        max_instructions=16,
+        instructions_folder_path=str(tmp_path / 'instructions'),
+        instructions_array_name='ram',
+        registers_array_name='registers',
+        memory_array_name='mem',
+        build_file_path=str(tmp_path / 'build' / 'cpu_test.vvp'),
+        server_mode=True,
+        memory_cells=4,
+        dump_format='hex'
+    )
+    yield api
+    api.close()
+
+
+def test_server_recovers_after_a_bad_dump(server_api):
+    with pytest.raises(ValueError):
+        server_api.run([ADDI(0, 1, 0)], time_out=5000)
+
+    # the rest of the bad dump must not be taken as the output of the next programs
+    for value in (1, 2):
+        registers, memory = server_api.run([ADDI(0, 1, value)], time_out=5000)
+        assert list(registers) == [value] * 32
+        assert list(memory) == [value] * 4